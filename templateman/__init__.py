@@ -6,13 +6,26 @@ Author: Valtteri Rajalainen
 
 import os
 import sys
-import shutil
-import subprocess as subp
-import tempfile
+import errno
+import locale
+import functools
+import contextlib
+import collections
 import typing as types
 
 
 running = False
+incremental = False
+copy_strategy = 'copy'
+profiler: types.Any = None
+template_bundle: types.Any = None
+plan: types.Any = None
+context: types.Any = None
+include_stack: types.List[str] = list()
+include_graph: types.Dict[str, types.List[str]] = dict()
+staging_directory: types.Optional[str] = None
+staging_target: types.Optional[str] = None
+file_stats: types.Dict[str, int] = { 'created': 0, 'updated': 0, 'unchanged': 0 }
 working_dir: str = os.getcwd()
 template_info: types.Dict[str, types.Optional[str]] = {
     'name':             'UNKNOWN',
@@ -21,14 +34,43 @@ template_info: types.Dict[str, types.Optional[str]] = {
 }
 
 
+def traced(*arg_names: str):
+    """
+    Record the calls of the decorated helper function in the active profiler.
+    The values of the given arguments are recorded with each call.
+    """
+    def decorator(func):
+        positions = [func.__code__.co_varnames.index(name) for name in arg_names]
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return func(*args, **kwargs)
+            details = {
+                name: str(args[i] if i < len(args) else kwargs.get(name))
+                for name, i in zip(arg_names, positions)
+            }
+            with profiler.span(func.__name__, 'helper', details):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def require_arguments(*args):
-    for arg in args:
-        if template_info.get(arg) == 'UNKNOWN':
-            print_error(f"Missing required argument '{arg}'")
-            abort()
+    missing = [arg for arg in args if template_info.get(arg) == 'UNKNOWN']
+    for arg in missing:
+        if context is not None:
+            context.missing_arguments.append(arg)
+        print_error(f"Missing required argument '{arg}'")
+    if missing:
+        abort()
 
 
 def print_error(message: str, add_newline = True):
+    if context is not None:
+        context.errors.append(message)
+        if context.quiet:
+            return
     prefix = '[ ERROR ] '
     sys.stderr.write(prefix)
     sys.stderr.write(message)
@@ -36,6 +78,16 @@ def print_error(message: str, add_newline = True):
         sys.stderr.write('\n')
 
 
+def report_output_error(err: Exception, message: types.Optional[str] = None):
+    """
+    Print the error of a helper function writing the output. OSErrors are
+    recorded as the output error of the active run, see templateman.api.
+    """
+    if context is not None and isinstance(err, OSError):
+        context.output_error = err
+    print_error(message or str(err))
+
+
 def abort():
     global running
     if running:
@@ -43,41 +95,523 @@ def abort():
         sys.exit(1)
 
 
+def begin_staging(output_directory: str):
+    """
+    Start writing the output into a staging directory inside the given output
+    directory. The staged output is moved into place by commit_staging, or
+    removed by discard_staging.
+    """
+    global staging_directory, staging_target
+    import tempfile
+    staging_target = os.path.abspath(output_directory)
+    os.makedirs(staging_target, exist_ok=True)
+    staging_directory = tempfile.mkdtemp(prefix='.templateman-stage-', dir=staging_target)
+
+
+def merge_staged_tree(src: str, dst: str):
+    for entry in os.scandir(src):
+        target = os.path.join(dst, entry.name)
+        if entry.is_dir(follow_symlinks=False) and os.path.isdir(target) and not os.path.islink(target):
+            merge_staged_tree(entry.path, target)
+            os.rmdir(entry.path)
+        else:
+            os.replace(entry.path, target)
+
+
+def commit_staging():
+    """
+    Move the staged output into the output directory. New directories are
+    moved with a single rename, existing directories are merged.
+    """
+    global staging_directory, staging_target
+    if staging_directory is None:
+        return
+    try:
+        merge_staged_tree(staging_directory, staging_target) # type: ignore
+        os.rmdir(staging_directory)
+    finally:
+        staging_directory = None
+        staging_target = None
+
+
+def discard_staging():
+    global staging_directory, staging_target
+    if staging_directory is not None:
+        import shutil
+        shutil.rmtree(staging_directory, ignore_errors=True)
+    staging_directory = None
+    staging_target = None
+
+
+def resolve_path(path: str) -> str:
+    """
+    Return the path where output for the given path is actually written.
+    When staging, paths inside the output directory are mapped into the
+    staging directory. Use this when writing files without the helpers
+    in this module.
+    """
+    if staging_directory is None:
+        return path
+    abspath = os.path.abspath(path)
+    if abspath == staging_target:
+        return staging_directory
+    if not abspath.startswith(os.path.join(staging_target, '')): # type: ignore
+        return path
+    return os.path.join(staging_directory, os.path.relpath(abspath, staging_target))
+
+
+def reject_staged_command(cmd: types.List[str]) -> types.Tuple[int, str]:
+    """
+    Commands can't be run in staged mode. Their output would be written
+    into the staging directory, and any absolute paths they record, for
+    example in virtual environments or editable installs, would point
+    to the staging directory after it is moved into place.
+    """
+    message = f"Can't run command '{' '.join(cmd)}' in staged mode"
+    print_error(message)
+    abort()
+    return 1, message
+
+
+def prepare_output_path(path: str, create_dirs = False) -> str:
+    """
+    Resolve the output path for the given path. When staging, the parent
+    directory is created in the staging directory if it exists in the
+    output directory.
+    """
+    target = resolve_path(path)
+    if target != path:
+        parent = os.path.dirname(target)
+        if not os.path.isdir(parent) and (create_dirs or os.path.isdir(os.path.dirname(os.path.abspath(path)))):
+            os.makedirs(parent)
+    return target
+
+
+@traced('path')
 def create_directory(path: str, create_dirs = False):
+    if plan is not None:
+        plan.record_directory(path, create_dirs)
+        return
+    if incremental and os.path.isdir(path):
+        return
     try:
+        target = prepare_output_path(path, create_dirs)
+        if target != path and os.path.exists(path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
         if create_dirs:
-            os.makedirs(path)
+            os.makedirs(target)
         else:
-            os.mkdir(path)
+            os.mkdir(target)
     
     except (OSError, PermissionError) as err:
-        print_error(str(err))
+        report_output_error(err)
         abort()
 
 
+@traced('path')
 def create_file(path: str):
+    if plan is not None:
+        plan.record_file(path)
+        return
+    if incremental and os.path.isfile(path):
+        file_stats['unchanged'] += 1
+        return
     try:
-        open(path, 'x').close()
+        target = prepare_output_path(path)
+        if target != path and os.path.exists(path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+        open(target, 'x').close()
+        file_stats['created'] += 1
     except (OSError, PermissionError) as err:
-        print_error(str(err))
+        report_output_error(err)
         abort()
 
 
-def copy_item(src: str, dst: str):
+def file_digest(path: str) -> bytes:
+    import hashlib
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.digest()
+
+
+@traced('path')
+def write_file(path: str, content: types.Union[str, bytes]):
+    """
+    Write the content into the file, replacing any existing content.
+    Strings are encoded as UTF-8. In incremental mode the file is not
+    touched if its content is already the same.
+    """
+    import hashlib
+    if plan is not None:
+        plan.record_file(path, content)
+        return
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    try:
+        exists = os.path.isfile(path)
+        if incremental and exists and os.path.getsize(path) == len(data):
+            if file_digest(path) == hashlib.sha256(data).digest():
+                file_stats['unchanged'] += 1
+                return
+
+        target = prepare_output_path(path)
+        exists = exists or os.path.isfile(target)
+        with open(target, 'wb') as file:
+            file.write(data)
+        file_stats['updated' if exists else 'created'] += 1
+
+    except (OSError, PermissionError) as err:
+        report_output_error(err)
+        abort()
+
+
+def render(template: types.Union[str, 'os.PathLike[str]'], **variables) -> str:
+    """
+    Render the template with the given variables, see templateman.engine
+    for the template syntax. The template is either the template text, or
+    a path-like object (pathlib.Path) of a template file. The values in
+    templateman.template_info are available as variables by default.
+    """
+    import templateman.engine as engine
+    return engine.render(template, { **template_info, **variables })
+
+
+@traced('path')
+def render_to_file(path: str, template: types.Union[str, 'os.PathLike[str]'], **variables):
+    """
+    Render the template into the file, replacing any existing content.
+    The output is written into a temporary file next to the target as it
+    is rendered, and moved into place only if rendering succeeds. In
+    incremental mode the file is not touched if its content is already
+    the same. Any exception raised while rendering the template is
+    reported as an error.
+    """
+    import threading
+    import templateman.engine as engine
+    try:
+        if incremental or plan is not None:
+            write_file(path, render(template, **variables))
+            return
+
+        chunks = engine.iter_render(template, { **template_info, **variables })
+        target = prepare_output_path(path)
+        exists = os.path.isfile(path) or os.path.isfile(target)
+        temp_path = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'x', encoding='utf-8') as file:
+                file.writelines(chunks)
+            if os.path.isfile(target):
+                os.chmod(temp_path, os.stat(target).st_mode & 0o7777)
+            os.replace(temp_path, target)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+        file_stats['updated' if exists else 'created'] += 1
+
+    except Exception as err:
+        report_output_error(err, f'Failed to render {path}: {err}')
+        abort()
+
+
+def copy_file_incremental(src: str, path: str, strategy: str):
+    """
+    Copy the file unless the file in the given path already has the
+    same content, and count it in file_stats like write_file does.
+    """
+    import templateman.copying as copying
+    exists = os.path.isfile(path)
+    if exists and os.path.getsize(path) == os.path.getsize(src):
+        if file_digest(path) == file_digest(src):
+            file_stats['unchanged'] += 1
+            return
+
+    target = prepare_output_path(path)
+    exists = exists or os.path.isfile(target)
+    if os.path.isfile(target):
+        # The file may be a hard link created by an earlier run
+        os.remove(target)
+    copying.copy_file(src, target, strategy)
+    file_stats['updated' if exists else 'created'] += 1
+
+
+def copy_tree_incremental(src: str, dst: str, strategy: str):
+    """
+    Merge the directory tree into the destination, copying only the
+    files whose content has changed.
+    """
+    for root, _, filenames in os.walk(src):
+        dst_root = os.path.normpath(os.path.join(dst, os.path.relpath(root, src)))
+        os.makedirs(resolve_path(dst_root), exist_ok=True)
+        for filename in filenames:
+            copy_file_incremental(os.path.join(root, filename), os.path.join(dst_root, filename), strategy)
+
+
+@traced('src', 'dst')
+def copy_item(src: str, dst: str, strategy: types.Optional[str] = None):
+    """
+    Copy a file or a directory tree. The strategy is one of 'copy', 'reflink',
+    'hardlink' or 'parallel', see templateman.copying for details. By default
+    the strategy set in templateman.copy_strategy is used. In incremental
+    mode directories are merged into existing ones, and files which already
+    have the same content are not copied.
+    """
+    import templateman.copying as copying
+    strategy = strategy or copy_strategy
+    if plan is not None:
+        plan.record_copy(src, dst, strategy)
+        return
     try:
+        if (os.path.isdir(dst) or os.path.isdir(resolve_path(dst))) and not os.path.isdir(src):
+            dst = os.path.join(dst, os.path.basename(src))
+        if strategy not in copying.STRATEGIES:
+            raise ValueError(f"Unknown copy strategy '{strategy}'")
+
+        if incremental:
+            if os.path.isdir(src):
+                copy_tree_incremental(src, dst, strategy)
+            else:
+                copy_file_incremental(src, dst, strategy)
+            return
+
+        target = prepare_output_path(dst)
+        if target != dst and os.path.isdir(src) and os.path.exists(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+
         if os.path.isdir(src):
-            shutil.copytree(src, dst)
+            copying.copy_tree(src, target, strategy)
         else:
-            shutil.copy(src, dst)
+            copying.copy_file(src, target, strategy)
 
-    except (OSError, PermissionError) as err:
-        print_error(str(err))
+    except (OSError, PermissionError, ValueError) as err:
+        report_output_error(err)
         abort()
 
 
-def run_command(cmd: types.List[str], path = working_dir) -> types.Tuple[int, str]:
+def read_asset(name: str) -> bytes:
+    """
+    Read an asset file from the bundle of the running template. The name
+    is relative to the bundle root, with forward slashes as separators.
+    Raises FileNotFoundError if the asset does not exist.
+    """
+    if template_bundle is None:
+        raise RuntimeError('The running template is not a template bundle')
+    return template_bundle.read(name)
+
+
+@traced('name', 'dst')
+def copy_asset(name: str, dst: str):
+    """
+    Copy an asset file, or all files under an asset directory, from the
+    bundle of the running template. Only the copied files are read from
+    the bundle.
+    """
+    try:
+        if template_bundle is None:
+            raise RuntimeError('The running template is not a template bundle')
+        if plan is not None:
+            plan.record_asset(template_bundle.path, name, dst)
+            return
+        target = prepare_output_path(dst)
+        if target != dst and os.path.isdir(dst):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), dst)
+        template_bundle.extract(name, target)
+
+    except (OSError, PermissionError, ValueError, RuntimeError) as err:
+        report_output_error(err)
+        abort()
+
+
+@traced('path')
+def create_venv(path: str, requirements: types.Optional[types.List[str]] = None) -> str:
+    """
+    Create a virtual environment with the given requirements installed.
+    The environment is cloned from a cached base environment, which is
+    built on the first call with the same interpreter and requirements.
+    See templateman.venvs for details. Returns the path of the Python
+    interpreter in the new environment. Virtual environments can't be
+    created in staged mode, since the interpreter could only be run after
+    the output is committed.
+    """
+    import templateman.venvs as venvs
+    requirements = list(requirements or list())
+    if plan is not None:
+        plan.record_venv(path, requirements)
+        return venvs.interpreter_path(os.path.abspath(path))
+    if staging_directory is not None:
+        print_error(f"Can't create virtual environment '{path}' in staged mode")
+        abort()
+        return venvs.interpreter_path(os.path.abspath(path))
+    try:
+        if incremental and os.path.isfile(venvs.interpreter_path(path)):
+            file_stats['unchanged'] += 1
+            return venvs.interpreter_path(os.path.abspath(path))
+
+        if os.path.exists(path):
+            raise FileExistsError(errno.EEXIST, os.strerror(errno.EEXIST), path)
+        base = venvs.cached_environment(requirements)
+        venvs.clone_environment(base, path)
+        file_stats['created'] += 1
+
+    except (OSError, PermissionError, RuntimeError) as err:
+        report_output_error(err)
+        abort()
+    return venvs.interpreter_path(os.path.abspath(path))
+
+
+@traced('cmd', 'path')
+def run_command(cmd: types.List[str], path: types.Optional[str] = None) -> types.Tuple[int, str]:
+    import tempfile
+    import subprocess as subp
+    if plan is not None:
+        plan.record_command(cmd, path)
+        return 0, ''
+    if staging_directory is not None:
+        return reject_staged_command(cmd)
     with tempfile.TemporaryFile(mode='w+') as file:
         proc = subp.run(cmd, cwd=path, stdout=file, stderr=file, text=True)
         file.seek(0)
         return proc.returncode, file.read()
 
+
+@traced('cmd', 'path')
+def run_command_streaming(
+    cmd: types.List[str],
+    path: types.Optional[str] = None,
+    callback: types.Optional[types.Callable[[str], None]] = None,
+    max_lines: int = 1000
+    ) -> types.Tuple[int, str]:
+    """
+    Run the command and pass each line of its output to the callback as soon
+    as it is written. By default the lines are written to stdout. Only the
+    last max_lines lines of the output are kept in memory and returned.
+    """
+    import subprocess as subp
+    if plan is not None:
+        plan.record_command(cmd, path)
+        return 0, ''
+    if staging_directory is not None:
+        return reject_staged_command(cmd)
+    tail: types.Deque[str] = collections.deque(maxlen=max_lines)
+    with subp.Popen(cmd, cwd=path, stdout=subp.PIPE, stderr=subp.STDOUT, text=True, errors='replace') as proc:
+        for line in proc.stdout: # type: ignore
+            tail.append(line)
+            if callback is None:
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                callback(line)
+    return proc.returncode, ''.join(tail)
+
+
+async def run_command_async(cmd: types.List[str], path: types.Optional[str] = None, timeout: types.Optional[float] = None) -> types.Tuple[int, str]:
+    """
+    Run the command without blocking the event loop. The output is read
+    from a pipe into memory. If the command doesn't finish in the given
+    timeout (in seconds), it is killed and the output read so far is returned.
+    """
+    import asyncio
+    import subprocess as subp
+    if plan is not None:
+        plan.record_command(cmd, path)
+        return 0, ''
+    if staging_directory is not None:
+        return reject_staged_command(cmd)
+    proc = await asyncio.create_subprocess_exec(*cmd, cwd=path, stdout=subp.PIPE, stderr=subp.STDOUT)
+    chunks: types.List[bytes] = list()
+
+    async def read_output():
+        while True:
+            chunk = await proc.stdout.read(65536) # type: ignore
+            if not chunk:
+                break
+            chunks.append(chunk)
+        await proc.wait()
+
+    try:
+        await asyncio.wait_for(read_output(), timeout)
+    except asyncio.TimeoutError:
+        # The process may have exited after the timeout expired
+        with contextlib.suppress(ProcessLookupError):
+            proc.kill()
+        await proc.wait()
+
+    output = b''.join(chunks).decode(locale.getpreferredencoding(False), errors='replace')
+    return proc.returncode, output # type: ignore
+
+
+@traced('cmds', 'path')
+def run_commands_parallel(
+    cmds: types.List[types.List[str]],
+    path: types.Optional[str] = None,
+    timeout: types.Optional[float] = None,
+    max_concurrency: types.Optional[int] = None
+    ) -> types.List[types.Tuple[int, str]]:
+    """
+    Run the commands concurrently, at most max_concurrency at a time.
+    Returns the (returncode, output) tuples in the order of the commands.
+    """
+    import asyncio
+    if staging_directory is not None and plan is None:
+        return [reject_staged_command(cmd) for cmd in cmds]
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max_concurrency or max(len(cmds), 1))
+
+        async def run(cmd: types.List[str]):
+            async with semaphore:
+                return await run_command_async(cmd, path, timeout)
+
+        return await asyncio.gather(*(run(cmd) for cmd in cmds))
+
+    return list(asyncio.run(run_all()))
+
+
+@traced('template')
+def include(template: str, **overrides):
+    """
+    Run another template in this process. The template is resolved like
+    in the 'run' command, so template names without a suffix refer to
+    installed templates. The included template gets the template_info of the
+    including template, updated with the given overrides, and the
+    template_info is restored when it finishes. Errors raised by the
+    included template are raised from this function.
+
+    The included templates are recorded in templateman.include_graph,
+    which maps the path of each template to the paths it included.
+    Including a template that is already being executed is an error.
+    """
+    import templateman.cli as cli
+    filepath, filename, error = cli.resolve_template_path(template)
+    filepath = os.path.abspath(filepath)
+    if error is None and not os.path.exists(filepath):
+        error = f"Can't find file '{filepath}'"
+    if error is None and filepath in include_stack:
+        cycle = include_stack[include_stack.index(filepath):] + [filepath]
+        error = 'Template include cycle: ' + ' -> '.join(cycle)
+    if error:
+        print_error(error)
+        abort()
+        return
+
+    if include_stack:
+        included = include_graph.setdefault(include_stack[-1], list())
+        if filepath not in included:
+            included.append(filepath)
+
+    info = dict(template_info)
+    template_info.update(overrides)
+    try:
+        cli.execute_included_template(filepath, filename)
+    finally:
+        template_info.clear()
+        template_info.update(info)
+
+
+def __getattr__(name: str):
+    # The runner is imported only when used, since it imports the cli
+    if name in ('Runner', 'RunResult', 'RunContext'):
+        import templateman.runner as runner
+        return getattr(runner, name)
+    raise AttributeError(f"module 'templateman' has no attribute '{name}'")
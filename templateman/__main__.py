@@ -9,6 +9,7 @@ import typing as types
 
 import templateman
 import templateman.cli as cli
+import templateman.client as client
 
 
 def main(args: types.List[str]) -> int:
@@ -21,6 +22,11 @@ def main(args: types.List[str]) -> int:
         templateman.print_error(f"Unknown command '{command}'. Use 'help' to check all commands...")
         return 1
     
+    if client.should_forward(command, args[1:]):
+        exit_code = client.forward_to_server(command, args[1:])
+        if exit_code is not None:
+            return exit_code
+    
     templateman.running = True
     cli.exec_command(command, args[1:])
     return 0
@@ -0,0 +1,58 @@
+"""
+Library API for running templates from Python code.
+
+The functions in this module raise the exceptions in templateman.errors
+instead of printing errors and exiting the process, so templates can be
+run in-process from other programs, such as build tools:
+
+    import templateman.api as api
+    import templateman.errors as errors
+
+    try:
+        result = api.run('py_project', name='example', author='me')
+    except errors.MissingArgumentError as err:
+        print('Missing arguments:', ', '.join(err.arguments))
+
+Author: Valtteri Rajalainen
+"""
+
+import typing as types
+import templateman.errors as errors
+from templateman.runner import Runner, RunResult
+
+
+def error_for_result(result: RunResult) -> errors.RunError:
+    """
+    Return the exception describing why the given run failed.
+    """
+    message = result.error or f"Template '{result.template}' failed"
+    if result.missing_arguments:
+        error: errors.RunError = errors.MissingArgumentError(message, result)
+    elif result.output_error is not None:
+        error = errors.OutputError(message, result)
+    elif isinstance(result.exception, Exception):
+        error = errors.TemplateExecutionError(message, result)
+    else:
+        error = errors.TemplateAbortedError(message, result)
+    error.__cause__ = result.exception
+    return error
+
+
+def run(template: str, runner: types.Optional[Runner] = None, **info) -> RunResult:
+    """
+    Run the template with the given template info values, for example
+    name, author and output_directory. The template is resolved like in
+    the 'run' command. Pass a Runner to set the run options.
+
+    Raises TemplateNotFoundError if the template doesn't exist, and a
+    RunError subclass if the run fails. Returns the RunResult of the run.
+    """
+    runner = runner or Runner()
+    filepath, filename, error = runner.resolve(template)
+    if error:
+        raise errors.TemplateNotFoundError(template, error)
+
+    result = runner.run_file(filepath, filename, info)
+    if not result.succeeded:
+        raise error_for_result(result)
+    return result
@@ -0,0 +1,182 @@
+"""
+Benchmark suite for the template execution pipeline.
+
+The results can be written into a JSON file, and compared against
+the results of a previous run to detect performance regressions.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import json
+import platform
+import statistics
+import tempfile
+import typing as types
+
+import templateman
+import templateman.cli as cli
+from templateman.benchmarks.cases import benchmarks
+
+
+def summarize(durations: types.List[float]) -> types.Dict[str, float]:
+    return {
+        'min': min(durations),
+        'median': statistics.median(durations),
+        'mean': statistics.mean(durations),
+        'repeat': len(durations),
+    }
+
+
+def run_suite(names: types.List[str], quick = False) -> types.Dict[str, dict]:
+    """
+    Run the given benchmarks, each in its own empty template directory.
+    """
+    results = dict()
+    environ = dict(os.environ)
+    try:
+        for name in names:
+            with tempfile.TemporaryDirectory() as workdir:
+                os.environ[cli.TEMPLATE_DIRECTORY_ENV_VAR] = workdir
+                results[name] = summarize(benchmarks[name](workdir, quick))
+            print(f"  {name:<28} {results[name]['median'] * 1000:10.3f} ms")
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+    return results
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> types.List[str]:
+    """
+    Compare the medians against the baseline results. Returns a list
+    of descriptions of benchmarks slower than the threshold (in percent).
+    """
+    regressions = list()
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None or previous['median'] <= 0:
+            continue
+        change = (result['median'] / previous['median'] - 1) * 100
+        if change > threshold:
+            regressions.append(f"{name}: {previous['median'] * 1000:.3f} ms -> {result['median'] * 1000:.3f} ms (+{change:.1f} %)")
+    return regressions
+
+
+def run_benchmarks(args: types.List[str]):
+    """
+    Run the benchmark suite for the template execution pipeline.
+
+    USAGE:
+
+        $ python -m templateman bench [arguments]
+
+    ARGUMENTS:
+        -q / --quick: Run the benchmarks with smaller inputs and fewer repeats.
+
+        -f / --filter: Run only benchmarks whose name contains the given text.
+
+        -o / --output: Write the results as JSON into the given file.
+
+        -c / --compare: Compare the results against a JSON file written by
+                        a previous run, and fail if any benchmark got slower
+                        than the threshold.
+
+        -t / --threshold: Provide the allowed slowdown in percent when comparing.
+                          Default value is 10.
+
+    """
+    quick = False
+    name_filter = ''
+    output_path = None
+    baseline_path = None
+    threshold = 10.0
+
+    def enable_quick(args: types.List[str]):
+        nonlocal quick
+        quick = True
+
+    def set_filter(args: types.List[str]):
+        nonlocal name_filter
+        name_filter = args[0]
+
+    def set_output_path(args: types.List[str]):
+        nonlocal output_path
+        output_path = os.path.join(templateman.working_dir, args[0])
+
+    def set_baseline_path(args: types.List[str]):
+        nonlocal baseline_path
+        baseline_path = os.path.join(templateman.working_dir, args[0])
+
+    def set_threshold(args: types.List[str]):
+        nonlocal threshold
+        try:
+            threshold = float(args[0])
+        except ValueError:
+            threshold = -1.0
+
+    all_options = {
+        '--quick': (0, enable_quick),
+        '-q': (0, enable_quick),
+
+        '--filter': (1, set_filter),
+        '-f': (1, set_filter),
+
+        '--output': (1, set_output_path),
+        '-o': (1, set_output_path),
+
+        '--compare': (1, set_baseline_path),
+        '-c': (1, set_baseline_path),
+
+        '--threshold': (1, set_threshold),
+        '-t': (1, set_threshold),
+    }
+    cli.parse_args(args, all_options)
+
+    if threshold < 0:
+        templateman.print_error('Threshold must be a non-negative number')
+        templateman.abort()
+        return
+
+    baseline = None
+    if baseline_path is not None:
+        try:
+            with open(baseline_path, 'r') as file:
+                baseline = json.load(file)['results']
+        except Exception as err:
+            error_message = f"Can't read benchmark results '{baseline_path}':\n"
+            error_message += f'{err.__class__.__name__}: {str(err)}'
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
+
+    names = [name for name in benchmarks if name_filter in name]
+    print(f'Running {len(names)} benchmarks (median of repeats):')
+    results = run_suite(names, quick)
+    report = {
+        'version': cli.VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+    if output_path is not None:
+        try:
+            with open(output_path, 'w') as file:
+                json.dump(report, file, indent=2)
+        except OSError as err:
+            error_message = f"Can't write benchmark results '{output_path}':\n"
+            error_message += f'{err.__class__.__name__}: {str(err)}'
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
+
+    if baseline is not None:
+        regressions = compare_results(results, baseline, threshold)
+        if regressions:
+            error_message = f'{len(regressions)} benchmarks are slower than the baseline:\n'
+            error_message += '\n'.join(regressions)
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
+        print(f'No regressions over {threshold:g} % compared to the baseline')
@@ -0,0 +1,184 @@
+"""
+Benchmarks for the template execution pipeline.
+
+Each benchmark receives an empty working directory and a flag for a
+quick run with smaller inputs, and returns the measured durations
+in seconds.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import sys
+import time
+import shutil
+import subprocess
+import contextlib
+import typing as types
+
+import templateman
+import templateman.cli as cli
+
+Benchmark = types.Callable[[str, bool], types.List[float]]
+
+benchmarks: types.Dict[str, Benchmark] = dict()
+
+
+def register_benchmark(name: str):
+    def wrapper(func: Benchmark):
+        benchmarks[name] = func
+        return func
+    return wrapper
+
+
+def measure(
+    func: types.Callable[[], None],
+    repeat: int,
+    setup: types.Optional[types.Callable[[], None]] = None,
+    warmup = False
+    ) -> types.List[float]:
+    """
+    Call func repeat times and return the durations. The output of func is
+    discarded. If warmup is set, func is called once before measuring.
+    """
+    durations = list()
+    with open(os.devnull, 'w') as devnull:
+        with contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+            if warmup:
+                func()
+            for _ in range(repeat):
+                if setup is not None:
+                    setup()
+                start = time.perf_counter()
+                func()
+                durations.append(time.perf_counter() - start)
+    return durations
+
+
+def write_script(path: str, lines: int):
+    with open(path, 'w') as file:
+        file.write('import templateman\n')
+        for i in range(lines):
+            file.write(f'value_{i} = {{"index": {i}, "name": templateman.template_info["name"]}}\n')
+
+
+def create_tree(root: str, width: int, depth: int, files_per_directory: int):
+    directories = [root]
+    for level in range(depth):
+        directories = [
+            os.path.join(directory, f'dir_{level}_{i}')
+            for directory in directories
+            for i in range(width)
+            ]
+        for directory in directories:
+            os.makedirs(directory)
+    
+    for directory, _, _ in os.walk(root):
+        for i in range(files_per_directory):
+            with open(os.path.join(directory, f'file_{i}.txt'), 'w') as file:
+                file.write('content\n' * 16)
+
+
+@register_benchmark('cli_cold_start')
+def cli_cold_start(workdir: str, quick: bool) -> types.List[float]:
+    env = dict(os.environ)
+    env[cli.TEMPLATE_DIRECTORY_ENV_VAR] = workdir
+    env['PY_TEMPLATES_SOCKET'] = os.path.join(workdir, 'no-server.sock')
+    cmd = [sys.executable, '-m', 'templateman', 'list']
+    run = lambda: subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, check=True) # type: ignore
+    return measure(run, 3 if quick else 10)
+
+
+def run_script_benchmark(workdir: str, lines: int, repeat: int, args: types.List[str]) -> types.List[float]:
+    script_path = os.path.join(workdir, 'script.py')
+    write_script(script_path, lines)
+    return measure(lambda: cli.run_template([script_path, *args]), repeat, warmup=True)
+
+
+@register_benchmark('run_small_script')
+def run_small_script(workdir: str, quick: bool) -> types.List[float]:
+    return run_script_benchmark(workdir, 10, 20 if quick else 200, list())
+
+
+@register_benchmark('run_small_script_no_cache')
+def run_small_script_no_cache(workdir: str, quick: bool) -> types.List[float]:
+    return run_script_benchmark(workdir, 10, 20 if quick else 200, ['--no-cache'])
+
+
+@register_benchmark('run_large_script')
+def run_large_script(workdir: str, quick: bool) -> types.List[float]:
+    return run_script_benchmark(workdir, 2_000 if quick else 20_000, 3 if quick else 10, list())
+
+
+@register_benchmark('run_large_script_no_cache')
+def run_large_script_no_cache(workdir: str, quick: bool) -> types.List[float]:
+    return run_script_benchmark(workdir, 2_000 if quick else 20_000, 3 if quick else 10, ['--no-cache'])
+
+
+def list_benchmark(workdir: str, count: int, repeat: int, cold: bool) -> types.List[float]:
+    for i in range(count):
+        open(os.path.join(workdir, f'template_{i}'), 'w').close()
+
+    cache_dir = os.path.join(workdir, cli.CACHE_DIRECTORY_NAME)
+    setup = (lambda: shutil.rmtree(cache_dir, ignore_errors=True)) if cold else None
+    return measure(lambda: cli.list_installed_templates(list()), repeat, setup, warmup=True)
+
+
+@register_benchmark('list_10')
+def list_10(workdir: str, quick: bool) -> types.List[float]:
+    return list_benchmark(workdir, 10, 20 if quick else 100, cold=False)
+
+
+@register_benchmark('list_1k')
+def list_1k(workdir: str, quick: bool) -> types.List[float]:
+    return list_benchmark(workdir, 1_000, 5 if quick else 50, cold=False)
+
+
+@register_benchmark('list_1k_cold')
+def list_1k_cold(workdir: str, quick: bool) -> types.List[float]:
+    return list_benchmark(workdir, 1_000, 3 if quick else 10, cold=True)
+
+
+@register_benchmark('list_10k')
+def list_10k(workdir: str, quick: bool) -> types.List[float]:
+    return list_benchmark(workdir, 1_000 if quick else 10_000, 3 if quick else 10, cold=False)
+
+
+def copy_benchmark(workdir: str, width: int, depth: int, files: int, strategy: str, repeat: int) -> types.List[float]:
+    src = os.path.join(workdir, 'src')
+    dst = os.path.join(workdir, 'dst')
+    create_tree(src, width, depth, files)
+    setup = lambda: shutil.rmtree(dst, ignore_errors=True)
+    return measure(lambda: templateman.copy_item(src, dst, strategy), repeat, setup)
+
+
+@register_benchmark('copy_item_wide')
+def copy_item_wide(workdir: str, quick: bool) -> types.List[float]:
+    return copy_benchmark(workdir, 1, 1, 200 if quick else 2_000, 'copy', 3 if quick else 10)
+
+
+@register_benchmark('copy_item_wide_parallel')
+def copy_item_wide_parallel(workdir: str, quick: bool) -> types.List[float]:
+    return copy_benchmark(workdir, 1, 1, 200 if quick else 2_000, 'parallel', 3 if quick else 10)
+
+
+@register_benchmark('copy_item_deep')
+def copy_item_deep(workdir: str, quick: bool) -> types.List[float]:
+    return copy_benchmark(workdir, 2, 5 if quick else 8, 2, 'copy', 3 if quick else 10)
+
+
+@register_benchmark('copy_item_deep_parallel')
+def copy_item_deep_parallel(workdir: str, quick: bool) -> types.List[float]:
+    return copy_benchmark(workdir, 2, 5 if quick else 8, 2, 'parallel', 3 if quick else 10)
+
+
+@register_benchmark('run_command')
+def run_command(workdir: str, quick: bool) -> types.List[float]:
+    cmd = [sys.executable, '-c', 'pass']
+    return measure(lambda: templateman.run_command(cmd, path=workdir), 5 if quick else 30)
+
+
+@register_benchmark('run_command_streaming')
+def run_command_streaming(workdir: str, quick: bool) -> types.List[float]:
+    cmd = [sys.executable, '-c', 'pass']
+    return measure(lambda: templateman.run_command_streaming(cmd, path=workdir), 5 if quick else 30)
@@ -0,0 +1,192 @@
+"""
+Template bundles: templates made of a script and its assets.
+
+A bundle is a directory, or a zip archive, with the template script in
+a file called __template__.py. Other files in the bundle are assets,
+which the script can read with templateman.read_asset and copy into
+the output with templateman.copy_asset. Asset names are relative to
+the bundle root and always use forward slashes.
+
+Installed directories are packed into a single zip archive. Archives
+are memory mapped and read on demand, so running a template only
+reads the script and the assets it actually uses.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import mmap
+import shutil
+import zipfile
+import typing as types
+
+
+ENTRY_POINT = '__template__.py'
+PACKED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+class DirectoryBundle:
+    """
+    A bundle which is a directory. Used when running bundles that
+    are not installed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entry_point_path = os.path.join(path, ENTRY_POINT)
+
+    def stat(self) -> os.stat_result:
+        return os.stat(self.entry_point_path)
+
+    def resolve(self, name: str) -> str:
+        path = os.path.normpath(os.path.join(self.path, *name.split('/')))
+        if os.path.relpath(path, self.path).split(os.sep)[0] == os.pardir:
+            raise FileNotFoundError(f"No asset '{name}' in template bundle")
+        return path
+
+    def names(self) -> types.List[str]:
+        names = list()
+        for root, _, filenames in os.walk(self.path):
+            relroot = os.path.relpath(root, self.path)
+            for filename in filenames:
+                names.append(os.path.normpath(os.path.join(relroot, filename)).replace(os.sep, '/'))
+        return sorted(names)
+
+    def read(self, name: str) -> bytes:
+        with open(self.resolve(name), 'rb') as file:
+            return file.read()
+
+    def extract(self, name: str, dst: str):
+        src = self.resolve(name)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        else:
+            shutil.copy(src, dst)
+
+    def close(self):
+        pass
+
+
+class MappedFile:
+    """
+    A read-only file object over a memory map, as expected by zipfile.
+    """
+
+    def __init__(self, map):
+        self.map = map
+
+    def seekable(self) -> bool:
+        return True
+
+    def __getattr__(self, name: str):
+        return getattr(self.map, name)
+
+
+class ArchiveBundle:
+    """
+    A bundle which is a zip archive. The archive is memory mapped, and
+    files are decompressed only when they are read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.archive = zipfile.ZipFile(MappedFile(self.map)) # type: ignore
+        except Exception:
+            self.close()
+            raise
+
+    def stat(self) -> os.stat_result:
+        return os.fstat(self.file.fileno())
+
+    def contains(self, name: str) -> bool:
+        try:
+            self.archive.getinfo(name)
+            return True
+        except KeyError:
+            return False
+
+    def names(self) -> types.List[str]:
+        return sorted(name for name in self.archive.namelist() if not name.endswith('/'))
+
+    def read(self, name: str) -> bytes:
+        try:
+            return self.archive.read(name)
+        except KeyError:
+            raise FileNotFoundError(f"No asset '{name}' in template bundle") from None
+
+    def extract(self, name: str, dst: str):
+        """
+        Extract a file, or all files under a directory, into the given path.
+        """
+        prefix = name.rstrip('/') + '/'
+        members = [info for info in self.archive.infolist() if info.filename.startswith(prefix)]
+        if not members:
+            members = [self.archive.getinfo(name)] if self.contains(name) else []
+            prefix = name
+        if not members:
+            raise FileNotFoundError(f"No asset '{name}' in template bundle")
+
+        for info in members:
+            relpath = info.filename[len(prefix):]
+            if os.pardir in relpath.split('/'):
+                raise ValueError(f"Invalid asset path '{info.filename}' in template bundle")
+            target = os.path.join(dst, *relpath.split('/')) if relpath else dst
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                continue
+            if os.path.dirname(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+            with self.archive.open(info) as src_file, open(target, 'wb') as dst_file:
+                shutil.copyfileobj(src_file, dst_file)
+
+    def close(self):
+        if getattr(self, 'archive', None) is not None:
+            self.archive.close()
+        if getattr(self, 'map', None) is not None:
+            self.map.close()
+        self.file.close()
+
+
+def open_bundle(path: str) -> types.Union[DirectoryBundle, ArchiveBundle, None]:
+    """
+    Open the directory or zip archive as a bundle. Returns None if it
+    does not contain a template script.
+    """
+    if os.path.isdir(path):
+        if not os.path.isfile(os.path.join(path, ENTRY_POINT)):
+            return None
+        return DirectoryBundle(path)
+
+    bundle = ArchiveBundle(path)
+    if not bundle.contains(ENTRY_POINT):
+        bundle.close()
+        return None
+    return bundle
+
+
+def pack_directory(src: str, dst: str):
+    """
+    Pack the directory into a zip archive. The archive is written into a
+    temporary file first, and then moved into place. The timestamps of
+    the files are not stored, so directories with the same content are
+    packed into identical archives.
+    """
+    temp_path = f'{dst}.{os.getpid()}.tmp'
+    try:
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for root, dirnames, filenames in os.walk(src):
+                dirnames[:] = sorted(name for name in dirnames if name != '__pycache__')
+                for filename in sorted(filenames):
+                    path = os.path.join(root, filename)
+                    info = zipfile.ZipInfo.from_file(path, os.path.relpath(path, src).replace(os.sep, '/'))
+                    info.date_time = PACKED_DATE_TIME
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    with open(path, 'rb') as src_file, archive.open(info, 'w') as dst_file:
+                        shutil.copyfileobj(src_file, dst_file)
+        os.replace(temp_path, dst)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
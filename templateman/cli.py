@@ -6,16 +6,27 @@ Author: Valtteri Rajalainen
 
 import sys
 import os
-import shutil
-import runpy
+import json
+import time
+import builtins
+import struct
+import marshal
+import importlib.util
 import contextlib
 import typing as types
+from types import CodeType
 import templateman
 
 VERSION = '1.0.0'
 TEMPLATE_DIRECTORY_ENV_VAR = 'PY_TEMPLATES_DIR'
+CACHE_DIRECTORY_NAME = '__tmcache__'
+INDEX_FILENAME = 'index.json'
+ZIP_MAGIC = b'PK\x03\x04'
+OUTPUT_FORMATS = ('text', 'json', 'ndjson')
 
 commands: types.Dict[str, types.Callable[[types.List[str],], None]] = dict()
+compiled_templates: types.Dict[str, types.Tuple[bytes, CodeType]] = dict()
+batch_worker_code: types.Optional[CodeType] = None
 
 
 def mkdir_exc_safe(path: str) -> types.Optional[str]:
@@ -27,13 +38,54 @@ def mkdir_exc_safe(path: str) -> types.Optional[str]:
     return error
 
 
-def copy_file_exc_safe(src: str, dst: str) -> types.Optional[str]:
-    error = None
+def store_template_exc_safe(src: str, template_dir: str, template_path: str) -> types.Tuple[bool, types.Optional[str]]:
+    """
+    Add the file, or the directory packed into a bundle, into the template
+    store and link it into the template path. Returns a tuple (changed, error),
+    where changed is False if the template was already installed with the
+    same content.
+    """
+    import tempfile
+    import templateman.store as store
+    store_dir = store.resolve_store_directory(template_dir)
     try:
-        shutil.copy(src, dst)
+        if os.path.isdir(src):
+            import templateman.bundles as bundles
+            os.makedirs(store_dir, exist_ok=True)
+            fd, packed_path = tempfile.mkstemp(suffix='.pack', dir=store_dir)
+            os.close(fd)
+            try:
+                bundles.pack_directory(src, packed_path)
+                blob = store.add_blob(store_dir, packed_path, move=True)
+            finally:
+                with contextlib.suppress(OSError):
+                    os.remove(packed_path)
+        else:
+            blob = store.add_blob(store_dir, src)
+        return store.link_blob(blob, template_path), None
     except Exception as err:
-        error = f"{err.__class__.__name__}: {str(err)}"
-    return error
+        return False, f"{err.__class__.__name__}: {str(err)}"
+
+
+def collect_store_garbage(template_dir: str):
+    """
+    Remove the stored content which is not linked to any installed template.
+    Installed templates which are regular files are hashed, since they may
+    be copies of the stored content.
+    """
+    import templateman.store as store
+    store_dir = store.resolve_store_directory(template_dir)
+    if not os.path.isdir(store_dir):
+        return
+    referenced = set()
+    with contextlib.suppress(OSError):
+        for name in os.listdir(template_dir):
+            path = os.path.join(template_dir, name)
+            if is_internal_name(name) or not os.path.isfile(path):
+                continue
+            digest = store.linked_blob(path)
+            referenced.add(digest or templateman.file_digest(path).hex())
+        store.collect_garbage(store_dir, referenced)
 
 
 def list_directory_exc_safe(path: str) -> types.Tuple[types.List[str], types.Optional[str]]:
@@ -64,6 +116,23 @@ def remove_file_exc_safe(path: str) -> types.Optional[str]:
         return str(err)
 
 
+class LazyCommand:
+    """
+    A command implemented in another module. The module is imported
+    only when the command is used.
+    """
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+
+    def resolve(self) -> types.Callable[[types.List[str],], None]:
+        return getattr(importlib.import_module(self.module), self.name)
+
+    def __call__(self, args: types.List[str]):
+        self.resolve()(args)
+
+
 def register_command(alias: str):
     def wrapper(func: types.Callable[[types.List[str],], None]):
         commands[alias] = func
@@ -71,6 +140,10 @@ def register_command(alias: str):
     return wrapper
 
 
+def register_lazy_command(alias: str, module: str, name: str):
+    commands[alias] = LazyCommand(module, name)
+
+
 def exec_command(command: str, args: types.List[str]):
     if command not in commands:
         raise RuntimeError(f"Unknown comman '{command}'")
@@ -101,6 +174,18 @@ def parse_args(args: types.List[str], options: dict):
         skip = end
 
 
+def print_records(records: types.List[dict], output_format: str):
+    """
+    Print the records as a JSON list, or as newline delimited JSON
+    with one record per line.
+    """
+    if output_format == 'json':
+        print(json.dumps(records, indent=2))
+        return
+    for record in records:
+        print(json.dumps(record))
+
+
 def resolve_template_directory() -> types.Optional[str]:
     path = None
     with contextlib.suppress(Exception):
@@ -109,6 +194,675 @@ def resolve_template_directory() -> types.Optional[str]:
     return path
 
 
+def is_internal_name(name: str) -> bool:
+    return name.startswith('__tm') and name.endswith('__')
+
+
+def resolve_cache_path(template_path: str) -> types.Optional[str]:
+    template_dir = resolve_template_directory()
+    if template_dir is None or not os.path.isdir(template_dir):
+        return None
+    import hashlib
+    key = hashlib.sha1(os.path.abspath(template_path).encode('utf-8')).hexdigest()
+    return os.path.join(template_dir, CACHE_DIRECTORY_NAME, key)
+
+
+def code_cache_header(stat: os.stat_result) -> bytes:
+    return importlib.util.MAGIC_NUMBER + struct.pack('<qq', stat.st_mtime_ns, stat.st_size)
+
+
+def read_code_cache(cache_path: str, stat: os.stat_result) -> types.Optional[CodeType]:
+    try:
+        with open(cache_path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    header = code_cache_header(stat)
+    if not data.startswith(header):
+        return None
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_code_cache(cache_path: str, stat: os.stat_result, code: CodeType):
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_path, 'wb') as file:
+            file.write(code_cache_header(stat))
+            file.write(marshal.dumps(code))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+
+
+def invalidate_code_cache(template_path: str):
+    cache_path = resolve_cache_path(template_path)
+    if cache_path is not None:
+        with contextlib.suppress(OSError):
+            os.remove(cache_path)
+
+
+def load_code(cache_path: types.Optional[str], stat: os.stat_result, read_source: types.Callable[[], types.Union[str, bytes]], filename: str) -> CodeType:
+    """
+    Compile the source returned by read_source, or load the compiled code
+    from the given cache file if the stat of the source is unchanged.
+    """
+    if cache_path is None:
+        return compile(read_source(), filename, 'exec')
+
+    header = code_cache_header(stat)
+    cached_header, code = compiled_templates.get(cache_path, (None, None))
+    if cached_header == header:
+        return code
+
+    code = read_code_cache(cache_path, stat)
+    if code is None:
+        code = compile(read_source(), filename, 'exec')
+        write_code_cache(cache_path, stat, code)
+    compiled_templates[cache_path] = (header, code)
+    return code
+
+
+def load_template_code(file, filename: str, use_cache = True) -> CodeType:
+    """
+    Compile the script in the given open file. The compiled code object
+    is stored in the cache directory inside the template directory, so
+    repeated runs of an unchanged script skip parsing and compilation.
+    """
+    cache_path = resolve_cache_path(file.name) if use_cache else None
+    stat = os.fstat(file.fileno())
+    return load_code(cache_path, stat, file.read, filename)
+
+
+def load_bundle_code(bundle, filename: str, use_cache = True) -> CodeType:
+    """
+    Compile the script of the template bundle. The code is cached like
+    the code of regular scripts.
+    """
+    import templateman.bundles as bundles
+    cache_path = resolve_cache_path(bundle.path) if use_cache else None
+    return load_code(cache_path, bundle.stat(), lambda: bundle.read(bundles.ENTRY_POINT), filename)
+
+
+def preload_installed_templates(template_dir: str) -> int:
+    """
+    Compile all installed templates into memory. Returns the number
+    of templates that were loaded succesfully.
+    """
+    loaded = 0
+    installed_templates, _ = list_directory_exc_safe(template_dir)
+    for filename in installed_templates:
+        filepath = os.path.join(template_dir, filename)
+        if is_internal_name(filename) or not os.path.isfile(filepath):
+            continue
+        if is_file_tree(filepath):
+            import templateman.filetree as filetree
+            bundle, error = open_template_bundle(filepath)
+            if error:
+                continue
+            with contextlib.suppress(Exception):
+                if bundle is not None:
+                    load_bundle_code(bundle, filename)
+                else:
+                    filetree.load_plan(filepath, resolve_cache_path(filepath))
+                loaded += 1
+            if bundle is not None:
+                bundle.close()
+            continue
+        file, error = open_file_exc_safe(filepath, 'r')
+        if error:
+            continue
+        with contextlib.suppress(Exception), file: # type: ignore
+            load_template_code(file, filename)
+            loaded += 1
+    return loaded
+
+
+def directory_mtime(path: str) -> types.Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def template_summary(path: str) -> str:
+    """
+    Return the first line of the module docstring of the template,
+    or an empty string if it has none.
+    """
+    with contextlib.suppress(Exception):
+        if is_file_tree(path):
+            import templateman.bundles as bundles
+            bundle = bundles.open_bundle(path)
+            if bundle is None:
+                return ''
+            try:
+                source = bundle.read(bundles.ENTRY_POINT)
+            finally:
+                bundle.close()
+        else:
+            with open(path, 'rb') as file:
+                source = file.read()
+        import ast
+        docstring = ast.get_docstring(ast.parse(source))
+        if docstring:
+            return docstring.strip().splitlines()[0]
+    return ''
+
+
+def template_index_entry(template_dir: str, name: str, previous: types.Optional[dict] = None) -> types.Optional[dict]:
+    """
+    Create the index entry for an installed template. The hash and the summary
+    are reused from the previous entry, if the size and mtime are unchanged.
+    """
+    path = os.path.join(template_dir, name)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+
+    if previous and previous.get('size') == stat.st_size and previous.get('mtime') == stat.st_mtime_ns:
+        return previous
+    
+    import templateman.store as store
+    try:
+        content_hash = store.linked_blob(path) or templateman.file_digest(path).hex()
+    except OSError:
+        content_hash = None
+    return {
+        'path': path,
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'hash': content_hash,
+        'summary': template_summary(path),
+    }
+
+
+def read_template_index(template_dir: str) -> types.Tuple[types.Optional[int], types.Dict[str, dict]]:
+    """
+    Read the template index without validating it. Returns a tuple
+    (directory mtime when the index was written, templates).
+    """
+    path = os.path.join(template_dir, CACHE_DIRECTORY_NAME, INDEX_FILENAME)
+    with contextlib.suppress(Exception):
+        with open(path, 'r') as file:
+            index = json.load(file)
+        return index['directory_mtime'], index['templates']
+    return None, dict()
+
+
+def write_template_index(template_dir: str, templates: types.Dict[str, dict]):
+    cache_dir = os.path.join(template_dir, CACHE_DIRECTORY_NAME)
+    path = os.path.join(cache_dir, INDEX_FILENAME)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        index = { 'directory_mtime': directory_mtime(template_dir), 'templates': templates }
+        with open(temp_path, 'w') as file:
+            json.dump(index, file)
+        os.replace(temp_path, path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+
+
+def load_template_index(template_dir: str) -> types.Tuple[types.Dict[str, dict], types.Optional[str]]:
+    """
+    Load the index of installed templates. The template directory is listed
+    again if it was modified after the index was written, and the entries of
+    templates whose size or mtime changed since then are rebuilt.
+    """
+    index_mtime, templates = read_template_index(template_dir)
+    stale = index_mtime is None or index_mtime != directory_mtime(template_dir)
+    if stale:
+        installed_templates, error = list_directory_exc_safe(template_dir)
+        if error:
+            return dict(), error
+        names = sorted(name for name in installed_templates if not is_internal_name(name))
+    else:
+        names = list(templates)
+
+    index = dict()
+    for name in names:
+        entry = template_index_entry(template_dir, name, templates.get(name))
+        if entry is not None:
+            index[name] = entry
+    if stale or index != templates:
+        write_template_index(template_dir, index)
+    return index, None
+
+
+def update_template_index(template_dir: str, name: str, previous_mtime: types.Optional[int]):
+    """
+    Update the index entry of a single installed or removed template.
+    The previous_mtime is the mtime of the template directory before it was
+    modified. If the index was not up to date at that time, it is rebuilt
+    on the next load instead.
+    """
+    update_template_index_entries(template_dir, [name], previous_mtime)
+
+
+def update_template_index_entries(template_dir: str, names: types.Iterable[str], previous_mtime: types.Optional[int]):
+    """
+    Update the index entries of many installed or removed templates at once.
+    See update_template_index for details.
+    """
+    index_mtime, templates = read_template_index(template_dir)
+    if index_mtime is None or index_mtime != previous_mtime:
+        return
+
+    for name in names:
+        entry = template_index_entry(template_dir, name)
+        if entry is None:
+            templates.pop(name, None)
+        else:
+            templates[name] = entry
+    write_template_index(template_dir, dict(sorted(templates.items())))
+
+
+def split_positional_args(args: types.List[str]) -> types.Tuple[types.List[str], types.List[str]]:
+    """
+    Split the arguments into the leading positional arguments and the options.
+    """
+    for i, arg in enumerate(args):
+        if arg.startswith('-'):
+            return args[:i], args[i:]
+    return args, list()
+
+
+def template_name(path: str) -> str:
+    _, filename = os.path.split(os.path.normpath(path))
+    filename, _ = os.path.splitext(filename)
+    return filename
+
+
+def expand_install_paths(paths: types.List[str]) -> types.Tuple[types.List[str], types.Optional[str]]:
+    """
+    Resolve the paths relative to the working directory and expand glob
+    patterns. Returns an error if a path without a pattern doesn't exist.
+    """
+    expanded = list()
+    for path in paths:
+        if not os.path.isabs(path):
+            path = os.path.join(templateman.working_dir, path)
+        if any(char in path for char in '*?['):
+            import glob
+            expanded.extend(sorted(glob.glob(path)))
+        elif os.path.exists(path):
+            expanded.append(path)
+        else:
+            return list(), f"Given path does not exist: '{path}'"
+    return expanded, None
+
+
+def is_installed_template_unchanged(src: str, entry: types.Optional[dict]) -> bool:
+    """
+    Check if the file has the same content as the installed template
+    described by the index entry. Directories are always reinstalled,
+    since the packed content is only known after packing them.
+    """
+    if entry is None or entry.get('hash') is None or os.path.isdir(src):
+        return False
+    try:
+        if os.path.getsize(src) != entry['size']:
+            return False
+        return templateman.file_digest(src).hex() == entry['hash']
+    except OSError:
+        return False
+
+
+def resolve_template_path(template: str) -> types.Tuple[str, str, types.Optional[str]]:
+    """
+    Resolve the path of the given template. If the template name has no
+    suffix, an installed template is searched, otherwise the path is
+    relative to the working directory.
+    """
+    filename, suffix = os.path.splitext(template)
+    filepath = os.path.join(templateman.working_dir, template)
+    if suffix != '':
+        return filepath, filename, None
+
+    template_dir = resolve_template_directory()
+    if template_dir is None:
+        return filepath, filename, 'Can\'t resolve users home directory for storing template scripts'
+
+    template_path = os.path.join(template_dir, filename)
+    if not is_internal_name(filename) and os.path.exists(template_path):
+        filepath = template_path
+    return filepath, filename, None
+
+
+def open_template(filepath: str) -> types.Tuple[object, types.Optional[str]]:
+    if not os.path.exists(filepath):
+        return None, f"Can't find file '{filepath}'"
+
+    file, error = open_file_exc_safe(filepath, 'r')
+    if error:
+        return None, f"Can't open file '{filepath}'"
+    return file, None
+
+
+def open_template_bundle(filepath: str) -> types.Tuple[object, types.Optional[str]]:
+    """
+    Open the directory or zip archive as a template bundle. Returns None
+    without an error, if it is a declarative file tree instead.
+    """
+    import templateman.bundles as bundles
+    try:
+        return bundles.open_bundle(filepath), None
+    except Exception as err:
+        error_message = f"Can't open template '{filepath}':\n"
+        error_message += f'{err.__class__.__name__}: {str(err)}'
+        return None, error_message
+
+
+def is_file_tree(filepath: str) -> bool:
+    """
+    Check if the template is a directory or a zip archive. These are
+    either template bundles or declarative file trees.
+    """
+    if os.path.isdir(filepath):
+        return True
+    with contextlib.suppress(OSError):
+        with open(filepath, 'rb') as file:
+            return file.read(len(ZIP_MAGIC)) == ZIP_MAGIC
+    return False
+
+
+def execute_template_code(code: CodeType, filepath: str):
+    """
+    Execute the compiled template in a fresh module namespace.
+    """
+    namespace = {
+        '__name__': '__main__',
+        '__file__': filepath,
+        '__builtins__': builtins,
+    }
+    templateman.include_stack.append(os.path.abspath(filepath))
+    try:
+        exec(code, namespace)
+    finally:
+        namespace.clear()
+        templateman.include_stack.pop()
+
+
+def execute_included_template(filepath: str, filename: str):
+    """
+    Execute a template included by the running template. The template
+    is executed like in execute_template_file, but errors are raised to
+    the including template and the run options are kept as they are.
+    """
+    if is_file_tree(filepath):
+        bundle, error = open_template_bundle(filepath)
+        if error:
+            raise RuntimeError(error)
+        if bundle is None:
+            import templateman.filetree as filetree
+            plan = filetree.load_plan(filepath, resolve_cache_path(filepath))
+            filetree.render_file_tree(plan, templateman.template_info['output_directory']) # type: ignore
+            return
+
+        previous_bundle = templateman.template_bundle
+        templateman.template_bundle = bundle
+        try:
+            execute_template_code(load_bundle_code(bundle, filename), filepath)
+        finally:
+            templateman.template_bundle = previous_bundle
+            bundle.close()
+        return
+
+    with open(filepath, 'r') as file:
+        code = load_template_code(file, filename)
+    execute_template_code(code, filepath)
+
+
+def reset_template_info(info: types.Dict[str, types.Any]):
+    templateman.template_info.clear()
+    templateman.template_info.update({
+        'name':             'UNKNOWN',
+        'output_directory': templateman.working_dir,
+        'author':           'UNKNOWN',
+    })
+    templateman.template_info.update(info)
+
+
+def load_manifest(path: str) -> types.Tuple[types.List[dict], types.Optional[str]]:
+    """
+    Read the rows of a batch manifest. The format is determined by the file
+    suffix: '.json' for a list of objects, '.ndjson' or '.jsonl' for one
+    object per line and '.csv' for a table with a header row. Empty CSV
+    cells are treated as missing values.
+    """
+    _, suffix = os.path.splitext(path)
+    suffix = suffix.lower()
+    if suffix not in ('.json', '.ndjson', '.jsonl', '.csv'):
+        return list(), f"Unsupported manifest format '{suffix}'"
+
+    rows = list()
+    try:
+        with open(path, 'r', newline='') as file:
+            if suffix == '.json':
+                rows = json.load(file)
+            elif suffix == '.csv':
+                import csv
+                rows = [
+                    { key: value for key, value in row.items() if key is not None and value != '' }
+                    for row in csv.DictReader(file)
+                    ]
+            else:
+                rows = [json.loads(line) for line in file if line.strip()]
+    except Exception as err:
+        return list(), f"{err.__class__.__name__}: {str(err)}"
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return list(), 'Manifest must contain a list of objects'
+    return rows, None
+
+
+def run_batch_row(code: CodeType, filepath: str, info: dict) -> types.Tuple[bool, types.Optional[str], float]:
+    """
+    Execute the compiled template once with the given template info.
+    Returns a tuple (success, error message, duration in seconds).
+    """
+    cwd = os.getcwd()
+    working_dir = templateman.working_dir
+    reset_template_info(info)
+    running = templateman.running
+    templateman.running = True
+    error = None
+    start = time.perf_counter()
+    try:
+        execute_template_code(code, filepath)
+    
+    except SystemExit:
+        error = 'Template aborted'
+    
+    except Exception as err:
+        error = f'{err.__class__.__name__}: {str(err)}'
+    
+    finally:
+        templateman.running = running
+        templateman.working_dir = working_dir
+        os.chdir(cwd)
+    
+    duration = time.perf_counter() - start
+    return error is None, error, duration
+
+
+def init_batch_worker(filepath: str, filename: str, use_cache: bool):
+    global batch_worker_code
+    with open(filepath, 'r') as file:
+        batch_worker_code = load_template_code(file, filename, use_cache)
+
+
+def run_batch_job(filepath: str, info: dict) -> types.Tuple[bool, types.Optional[str], float]:
+    """
+    Execute a single row of a batch in a worker process. The worker
+    must be initialized with init_batch_worker.
+    """
+    try:
+        return run_batch_row(batch_worker_code, filepath, info) # type: ignore
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def run_batch_parallel(filepath: str, filename: str, use_cache: bool, rows: types.List[dict], jobs: int):
+    """
+    Execute the rows in a pool of worker processes. Results are yielded
+    in the order of the rows.
+    """
+    import concurrent.futures
+    sys.stdout.flush()
+    sys.stderr.flush()
+    initargs = (filepath, filename, use_cache)
+    with concurrent.futures.ProcessPoolExecutor(jobs, initializer=init_batch_worker, initargs=initargs) as executor:
+        futures = [executor.submit(run_batch_job, filepath, info) for info in rows]
+        for future in futures:
+            try:
+                yield future.result()
+            except Exception as err:
+                yield False, f'{err.__class__.__name__}: {str(err)}', 0.0
+
+
+def profile_phase(name: str, **details):
+    if templateman.profiler is None:
+        return contextlib.nullcontext()
+    return templateman.profiler.span(name, 'phase', details)
+
+
+def report_profile(profiler, cprofile, profile_path: types.Optional[str], trace_path: types.Optional[str]):
+    print(profiler.format_summary())
+    try:
+        if cprofile is not None and profile_path:
+            cprofile.dump_stats(profile_path)
+        if trace_path:
+            profiler.write_chrome_trace(trace_path)
+    except OSError as err:
+        error_message = "Can't write profiling output:\n"
+        error_message += f'{err.__class__.__name__}: {str(err)}'
+        templateman.print_error(error_message)
+
+
+def report_plan(plan, plan_path: types.Optional[str]):
+    print(plan.format_summary())
+    if plan_path is None:
+        return
+    try:
+        plan.write(plan_path)
+    except OSError as err:
+        error_message = "Can't write plan:\n"
+        error_message += f'{err.__class__.__name__}: {str(err)}'
+        templateman.print_error(error_message)
+
+
+def execute_template_file(
+    filepath: str,
+    filename: str,
+    use_cache: bool,
+    incremental: bool,
+    staged: bool,
+    copy_strategy: str,
+    cprofile = None
+    ) -> bool:
+    """
+    Open, compile and execute the template script with the given
+    run options. Returns True if the template finished succesfully.
+    """
+    file = None
+    bundle = None
+    file_tree = is_file_tree(filepath)
+    with profile_phase('open', path=filepath):
+        if file_tree:
+            bundle, error = open_template_bundle(filepath)
+        else:
+            file, error = open_template(filepath)
+    if error:
+        templateman.print_error(error)
+        templateman.abort()
+        return False
+
+    if staged:
+        try:
+            templateman.begin_staging(templateman.template_info['output_directory']) # type: ignore
+        except OSError as err:
+            if file is not None:
+                file.close() # type: ignore
+            if bundle is not None:
+                bundle.close()
+            error_message = 'Failed to create staging directory:\n'
+            error_message += f'{err.__class__.__name__}: {str(err)}'
+            templateman.print_error(error_message)
+            templateman.abort()
+            return False
+
+    templateman.incremental = incremental
+    templateman.copy_strategy = copy_strategy
+    templateman.file_stats.update(created=0, updated=0, unchanged=0)
+    templateman.include_graph.clear()
+    succeeded = False
+    try:
+        if file_tree and bundle is None:
+            import templateman.filetree as filetree
+            with profile_phase('compile'):
+                plan = filetree.load_plan(filepath, resolve_cache_path(filepath) if use_cache else None)
+            with profile_phase('execute'):
+                filetree.render_file_tree(plan, templateman.template_info['output_directory']) # type: ignore
+        else:
+            with profile_phase('compile'):
+                if bundle is not None:
+                    code = load_bundle_code(bundle, filename, use_cache)
+                else:
+                    code = load_template_code(file, filename, use_cache)
+            templateman.template_bundle = bundle
+            with profile_phase('execute'):
+                if cprofile is not None:
+                    cprofile.runcall(execute_template_code, code, filepath)
+                else:
+                    execute_template_code(code, filepath)
+        succeeded = True
+    
+    except Exception as err:
+        error_message = 'There were errors during the execution of the script:'
+        error_message += f'\n{err.__class__.__name__}: {str(err)}'
+        templateman.print_error(error_message)
+        templateman.abort()
+        return False
+    
+    finally:
+        templateman.incremental = False
+        templateman.template_bundle = None
+        if file is not None:
+            file.close() # type: ignore
+        if bundle is not None:
+            bundle.close()
+        if not succeeded:
+            templateman.discard_staging()
+
+    if staged:
+        try:
+            with profile_phase('commit'):
+                templateman.commit_staging()
+        except OSError as err:
+            error_message = 'Failed to move staged output into place:\n'
+            error_message += f'{err.__class__.__name__}: {str(err)}'
+            templateman.print_error(error_message)
+            templateman.abort()
+            return False
+
+    if incremental and (templateman.context is None or not templateman.context.quiet):
+        stats = templateman.file_stats
+        print(f"Files created: {stats['created']}, updated: {stats['updated']}, unchanged: {stats['unchanged']}")
+    return True
+
+
 @register_command('help')
 def print_help(args: types.List[str]):
     """Show this help information."""
@@ -117,7 +871,10 @@ def print_help(args: types.List[str]):
             return '  > ' + name + ': ' + 'No description available...\n'
         return '  > ' + name + ': ' + docstring.strip() + '\n'
 
-    commands_help = [format_command_info(name, func.__doc__) for name, func in commands.items()]
+    def resolve_command(func):
+        return func.resolve() if isinstance(func, LazyCommand) else func
+
+    commands_help = [format_command_info(name, resolve_command(func).__doc__) for name, func in commands.items()]
     help_text = [
         f'TemplateManager, version: {VERSION}',
         '',
@@ -139,12 +896,20 @@ def print_help(args: types.List[str]):
 @register_command('remove')
 def remove_installed_template(args: types.List[str]):
     """
-    Remove installed template. This will remove the file from the
+    Remove installed templates. This will remove the files from the
     template directory permanently.
 
     USAGE:
     
-        $ python -m templateman remove [template-name]
+        $ python -m templateman remove [template-names...] [arguments]
+
+    ARGUMENTS:
+        -y / --yes: Remove the templates without asking for confirmation.
+
+        --format: Provide the output format. One of 'text', 'json' or 'ndjson'.
+                  The structured formats output a record for each template
+                  with its name, path, status and error. Requires --yes.
+                  Default value is "text".
 
     """
     template_dir = resolve_template_directory()
@@ -154,32 +919,124 @@ def remove_installed_template(args: types.List[str]):
         templateman.abort()
         return
 
-    if len(args) == 0:
+    names, options = split_positional_args(args)
+    if len(names) == 0:
         templateman.print_error("Command 'remove' expected atleast one argument")
         templateman.abort()
         return
 
-    template_path = os.path.join(template_dir, args[0])
-    if not os.path.exists(template_path):
-        templateman.print_error(f"No template installed with name '{args[0]}'")
+    confirmed = False
+    output_format = 'text'
+
+    def confirm(args: types.List[str]):
+        nonlocal confirmed
+        confirmed = True
+
+    def set_output_format(args: types.List[str]):
+        nonlocal output_format
+        output_format = args[0]
+
+    all_options = {
+        '--yes': (0, confirm),
+        '-y': (0, confirm),
+
+        '--format': (1, set_output_format),
+    }
+    parse_args(options, all_options)
+
+    if output_format not in OUTPUT_FORMATS:
+        templateman.print_error(f"Unknown output format '{output_format}'")
         templateman.abort()
         return
 
-    print(f"Are you sure you want to remove file '{template_path}' premanently?")
-    ans = input('Input Y/y to remove this file: ')
-    if ans.lower() == 'y':
-        error = remove_file_exc_safe(template_path)
-        if error:
-            error_message = 'Unexpected error when removing file:\n'
-            error_message += error
-            templateman.print_error(error_message)
+    if output_format != 'text' and not confirmed:
+        templateman.print_error(f"Option '--format {output_format}' requires '--yes'")
+        templateman.abort()
+        return
+
+    template_paths = [os.path.join(template_dir, name) for name in names]
+    for name, template_path in zip(names, template_paths):
+        if is_internal_name(name) or not os.path.exists(template_path):
+            templateman.print_error(f"No template installed with name '{name}'")
             templateman.abort()
             return
 
+    if not confirmed:
+        if len(template_paths) == 1:
+            print(f"Are you sure you want to remove file '{template_paths[0]}' premanently?")
+            ans = input('Input Y/y to remove this file: ')
+        else:
+            print(f"Are you sure you want to remove {len(template_paths)} files premanently?")
+            for template_path in template_paths:
+                print('> ', template_path)
+            ans = input('Input Y/y to remove these files: ')
+        confirmed = ans.lower() == 'y'
+
+    if not confirmed:
+        return
+
+    previous_mtime = directory_mtime(template_dir)
+    removed = list()
+    records = list()
+    failed = False
+    for name, template_path in zip(names, template_paths):
+        error = remove_file_exc_safe(template_path)
+        records.append({
+            'name': name,
+            'path': template_path,
+            'status': 'failed' if error else 'removed',
+            'error': error,
+        })
+        if error:
+            if output_format == 'text':
+                error_message = f"Unexpected error when removing file '{template_path}':\n"
+                error_message += error
+                templateman.print_error(error_message)
+            failed = True
+            continue
+        invalidate_code_cache(template_path)
+        removed.append(name)
+
+    update_template_index_entries(template_dir, removed, previous_mtime)
+    collect_store_garbage(template_dir)
+    if output_format != 'text':
+        print_records(records, output_format)
+    if failed:
+        templateman.abort()
+
 
 @register_command('list')
 def list_installed_templates(args: types.List[str]):
-    """List all installed templates."""
+    """
+    List all installed templates.
+
+    USAGE:
+
+        $ python -m templateman list [arguments]
+
+    ARGUMENTS:
+        --format: Provide the output format. One of 'text', 'json' or 'ndjson'.
+                  The structured formats output a record for each template
+                  with its name, path, size, hash and summary.
+                  Default value is "text".
+
+    """
+    output_format = 'text'
+
+    def set_output_format(args: types.List[str]):
+        nonlocal output_format
+        output_format = args[0]
+
+    all_options = {
+        '--format': (1, set_output_format),
+    }
+    parse_args(args, all_options)
+
+    if output_format not in OUTPUT_FORMATS:
+        templateman.print_error(f"Unknown output format '{output_format}'")
+        templateman.abort()
+        return
+
     template_dir = resolve_template_directory()
     if template_dir is None:
         error_message = 'Can\'t resolve users home directory for storing template scripts'
@@ -196,7 +1053,7 @@ def list_installed_templates(args: types.List[str]):
             templateman.abort()
             return
 
-    installed_templates, error = list_directory_exc_safe(template_dir)
+    installed_templates, error = load_template_index(template_dir)
     if error:
         error_message = 'Unexpected error when listing installed templates:\n'
         error_message += error
@@ -204,6 +1061,20 @@ def list_installed_templates(args: types.List[str]):
         templateman.abort()
         return
 
+    if output_format != 'text':
+        records = [
+            {
+                'name': name,
+                'path': entry['path'],
+                'size': entry['size'],
+                'hash': entry['hash'],
+                'summary': entry['summary'],
+            }
+            for name, entry in installed_templates.items()
+        ]
+        print_records(records, output_format)
+        return
+
     print('Templates stored in directory:')
     print(template_dir)
     print()
@@ -216,12 +1087,30 @@ def list_installed_templates(args: types.List[str]):
 @register_command('install')
 def install_template(args: types.List[str]):
     """
-    Install a template script. This creates a copy of the provided file
-    into the template directory.
+    Install template scripts. This creates a copy of each provided file
+    into the template directory. Glob patterns are expanded, and the
+    templates are installed concurrently. Directories are packed into a
+    single zip archive, see templateman.bundles for details. The content
+    is stored only once, and the installed templates link to it, so
+    installing identical files doesn't copy them again, see
+    templateman.store for details.
 
     USAGE:
 
-        $ python -m templateman install [filepath]
+        $ python -m templateman install [filepaths...] [arguments]
+
+    ARGUMENTS:
+        --sync: Provide a directory, whose files and subdirectories are
+                installed as templates. Templates with the same content
+                already installed are skipped.
+
+        -j / --jobs: Provide the number of templates installed concurrently.
+                     Default value depends on the number of CPUs.
+
+        --format: Provide the output format. One of 'text', 'json' or 'ndjson'.
+                  The structured formats output a record for each template
+                  with its name, source, path, status, size, hash and error.
+                  Default value is "text".
     
     """
     template_dir = resolve_template_directory()
@@ -239,32 +1128,136 @@ def install_template(args: types.List[str]):
             templateman.print_error(error_message)
             templateman.abort()
             return
+
+    paths, options = split_positional_args(args)
+    sync_directory = None
+    jobs = None
+    output_format = 'text'
+
+    def set_sync_directory(args: types.List[str]):
+        nonlocal sync_directory
+        sync_directory = os.path.join(templateman.working_dir, args[0])
+
+    def set_jobs(args: types.List[str]):
+        nonlocal jobs
+        jobs = int(args[0]) if args[0].isdigit() else 0
+
+    def set_output_format(args: types.List[str]):
+        nonlocal output_format
+        output_format = args[0]
+
+    all_options = {
+        '--sync': (1, set_sync_directory),
+
+        '--jobs': (1, set_jobs),
+        '-j': (1, set_jobs),
+
+        '--format': (1, set_output_format),
+    }
+    parse_args(options, all_options)
     
-    if len(args) < 1:
+    if len(paths) < 1 and sync_directory is None:
         templateman.print_error("Command 'install' expected atleast one argument")
         templateman.abort()
         return
 
-    filepath = args[0]
-    if not os.path.isabs(filepath):
-        filepath = os.path.join(templateman.working_dir, filepath)
-    
-    if not os.path.exists(filepath):
-        templateman.print_error("Given path does not exist")
+    if jobs is not None and jobs < 1:
+        templateman.print_error('Number of jobs must be a positive integer')
         templateman.abort()
         return
 
-    _, filename = os.path.split(filepath)
-    filename, _ = os.path.splitext(filename)
+    if output_format not in OUTPUT_FORMATS:
+        templateman.print_error(f"Unknown output format '{output_format}'")
+        templateman.abort()
+        return
 
-    error = copy_file_exc_safe(filepath, os.path.join(template_dir, filename))
+    filepaths, error = expand_install_paths(paths)
     if error:
-        error_message = 'Install failed:\n'
-        error_message += error
-        templateman.print_error(error_message)
+        templateman.print_error(error)
         templateman.abort()
         return
 
+    synced = 0
+    unchanged_sources: types.Dict[str, str] = dict()
+    if sync_directory is not None:
+        entries, error = list_directory_exc_safe(sync_directory)
+        if error:
+            error_message = f"Can't read directory '{sync_directory}':\n"
+            error_message += error
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
+
+        installed_templates, _ = load_template_index(template_dir)
+        for entry in sorted(entries):
+            filepath = os.path.join(sync_directory, entry)
+            if entry.startswith('.') or entry == '__pycache__':
+                continue
+            synced += 1
+            if is_installed_template_unchanged(filepath, installed_templates.get(template_name(filepath))):
+                unchanged_sources[template_name(filepath)] = filepath
+                continue
+            filepaths.append(filepath)
+
+    sources: types.Dict[str, str] = dict()
+    for filepath in filepaths:
+        name = template_name(filepath)
+        if is_internal_name(name) or name in sources:
+            templateman.print_error(f"Can't install '{filepath}' as template '{name}'")
+            templateman.abort()
+            return
+        sources[name] = filepath
+
+    def install(name: str) -> types.Tuple[bool, types.Optional[str]]:
+        return store_template_exc_safe(sources[name], template_dir, os.path.join(template_dir, name)) # type: ignore
+
+    previous_mtime = directory_mtime(template_dir)
+    if len(sources) > 1 and jobs != 1:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(jobs) as executor:
+            results = list(executor.map(install, sources))
+    else:
+        results = [install(name) for name in sources]
+
+    changed_names = list()
+    unchanged_names = list(unchanged_sources)
+    errors: types.Dict[str, str] = dict()
+    for name, (changed, error) in zip(sources, results):
+        if error:
+            errors[name] = error
+            if output_format == 'text':
+                error_message = f"Install of '{sources[name]}' failed:\n"
+                error_message += error
+                templateman.print_error(error_message)
+        elif changed:
+            invalidate_code_cache(os.path.join(template_dir, name))
+            changed_names.append(name)
+        else:
+            unchanged_names.append(name)
+
+    if changed_names:
+        update_template_index_entries(template_dir, changed_names, previous_mtime)
+    if output_format != 'text':
+        installed_templates, _ = load_template_index(template_dir)
+        records = list()
+        for name, source in { **unchanged_sources, **sources }.items():
+            status = 'failed' if name in errors else 'installed' if name in changed_names else 'unchanged'
+            entry = installed_templates.get(name, dict())
+            records.append({
+                'name': name,
+                'source': source,
+                'path': os.path.join(template_dir, name),
+                'status': status,
+                'size': entry.get('size'),
+                'hash': entry.get('hash'),
+                'error': errors.get(name),
+            })
+        print_records(records, output_format)
+    elif synced or len(sources) > 1:
+        print(f"Installed {len(changed_names)} templates, {len(unchanged_names)} unchanged, {len(errors)} failed")
+    if errors:
+        templateman.abort()
+
 
 @register_command('run')
 def run_template(args: types.List[str]):
@@ -273,6 +1266,11 @@ def run_template(args: types.List[str]):
     template is searched. If file has any suffix, the current working directory is
     searched.
 
+    If the template is a directory or a zip archive, it is rendered as a
+    declarative file tree: the files are copied into the output directory,
+    and placeholders like {name} and {author} in their paths and contents
+    are replaced with the given values.
+
     USAGE:
 
         $ python -m templateman run [template-name] [arguments]
@@ -289,26 +1287,66 @@ def run_template(args: types.List[str]):
                        in config/setup files in place of project's author name.
                        Default value is "UNKNOWN".
 
+        --no-cache: Always compile the script from source instead of using
+                    the cached bytecode in the template directory.
+
+        --incremental: Allow running the script over existing output. Existing
+                       directories and files are reused, and files written
+                       with templateman.write_file or copied with
+                       templateman.copy_item are only touched if their
+                       content changes.
+
+        --staged: Write the output into a staging directory inside the output
+                  directory, and move it into place only if the script finishes
+                  succesfully. If the script fails, the output directory is left
+                  untouched. Scripts that run commands or create
+                  virtual environments can't be staged.
+
+        --copy-strategy: Provide the default strategy for templateman.copy_item.
+                         One of 'copy', 'reflink', 'hardlink' or 'parallel'.
+                         Default value is "copy".
+
+        --profile: Measure the wall time of each phase of the run and of each
+                   templateman helper call, and print a summary at the end.
+
+        --profile-output: Profile the script execution with cProfile and write
+                          the statistics into the given file. Implies --profile.
+
+        --trace-output: Write the recorded spans into the given file in the
+                        Chrome trace event format. Implies --profile.
+
+        --dry-run: Record the operations of the templateman helper functions
+                   instead of performing them, and print the planned operations
+                   with their estimated I/O volume. Commands are not run, and
+                   they are assumed to succeed with no output.
+
+        --plan-output: Write the recorded plan into the given file as JSON.
+                       The plan can be performed later with the 'apply' command.
+                       Implies --dry-run.
+
+        --watch: Keep running, and run the template again every time the script,
+                 or any file of a template directory, changes. The script is
+                 recompiled only when it changes. Implies --incremental.
+
+        --format: Provide the output format. One of 'text', 'json' or 'ndjson'.
+                  The structured formats output a record of the run with the
+                  template path, status, duration, file statistics and errors.
+                  The output of the script is written to stderr instead.
+                  Default value is "text".
+
     """
     if len(args) < 1:
         templateman.print_error("Command 'run' expected atleast one argument")
         templateman.abort()
         return
     
-    filename, suffix = os.path.splitext(args[0])
-    filepath = os.path.join(templateman.working_dir, args[0])
-    
-    if suffix == '':
-        template_dir = resolve_template_directory()
-        if template_dir is None:
-            error_message = 'Can\'t resolve users home directory for storing template scripts'
-            templateman.print_error(error_message)
-            templateman.abort()
-            return
-        
-        installed_templates, error = list_directory_exc_safe(template_dir)
-        if not error and filename in installed_templates:
-            filepath = os.path.join(template_dir, filename)
+    resolve_start = time.perf_counter()
+    filepath, filename, error = resolve_template_path(args[0])
+    resolve_end = time.perf_counter()
+    if error:
+        templateman.print_error(error)
+        templateman.abort()
+        return
 
     def set_name(args: types.List[str]):
         templateman.template_info['name'] = args[0]
@@ -319,6 +1357,68 @@ def run_template(args: types.List[str]):
     def set_output_directory(args: types.List[str]):
         templateman.template_info['output_directory'] = args[0]
 
+    use_cache = True
+    incremental = False
+    staged = False
+
+    def disable_cache(args: types.List[str]):
+        nonlocal use_cache
+        use_cache = False
+
+    def enable_incremental(args: types.List[str]):
+        nonlocal incremental
+        incremental = True
+
+    def enable_staging(args: types.List[str]):
+        nonlocal staged
+        staged = True
+
+    copy_strategy = templateman.copy_strategy
+
+    def set_copy_strategy(args: types.List[str]):
+        nonlocal copy_strategy
+        copy_strategy = args[0]
+
+    profile = False
+    profile_path = None
+    trace_path = None
+
+    def enable_profiling(args: types.List[str]):
+        nonlocal profile
+        profile = True
+
+    def set_profile_path(args: types.List[str]):
+        nonlocal profile_path
+        profile_path = os.path.join(templateman.working_dir, args[0])
+
+    def set_trace_path(args: types.List[str]):
+        nonlocal trace_path
+        trace_path = os.path.join(templateman.working_dir, args[0])
+
+    dry_run = False
+    plan_path = None
+
+    def enable_dry_run(args: types.List[str]):
+        nonlocal dry_run
+        dry_run = True
+
+    def set_plan_path(args: types.List[str]):
+        nonlocal plan_path
+        plan_path = os.path.join(templateman.working_dir, args[0])
+
+    watch = False
+
+    def enable_watching(args: types.List[str]):
+        nonlocal watch, incremental
+        watch = True
+        incremental = True
+
+    output_format = 'text'
+
+    def set_output_format(args: types.List[str]):
+        nonlocal output_format
+        output_format = args[0]
+
     all_options = {
         '--name': (1, set_name),
         '-n': (1, set_name),
@@ -328,31 +1428,242 @@ def run_template(args: types.List[str]):
 
         '--output-directory': (1, set_output_directory),
         '-o': (1, set_output_directory),
+
+        '--no-cache': (0, disable_cache),
+        '--incremental': (0, enable_incremental),
+        '--staged': (0, enable_staging),
+        '--copy-strategy': (1, set_copy_strategy),
+
+        '--profile': (0, enable_profiling),
+        '--profile-output': (1, set_profile_path),
+        '--trace-output': (1, set_trace_path),
+
+        '--dry-run': (0, enable_dry_run),
+        '--plan-output': (1, set_plan_path),
+
+        '--watch': (0, enable_watching),
+
+        '--format': (1, set_output_format),
     }
     parse_args(args[1:], all_options)
 
-    if not os.path.exists(filepath):
-        error_message = f"Can't find file '{filepath}'"
-        templateman.print_error(error_message)
+    if copy_strategy != templateman.copy_strategy:
+        import templateman.copying as copying
+        if copy_strategy not in copying.STRATEGIES:
+            templateman.print_error(f"Unknown copy strategy '{copy_strategy}'")
+            templateman.abort()
+            return
+
+    if output_format not in OUTPUT_FORMATS:
+        templateman.print_error(f"Unknown output format '{output_format}'")
         templateman.abort()
         return
 
-    file, error = open_file_exc_safe(filepath, 'r')
+    if output_format != 'text':
+        if watch or dry_run or plan_path or profile or profile_path or trace_path:
+            error_message = "Option '--format' can't be combined with '--watch', '--dry-run' or the profiling options"
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
+        import templateman.runner as runner
+        template_runner = runner.Runner(use_cache, incremental, staged, copy_strategy, templateman.working_dir)
+        with contextlib.redirect_stdout(sys.stderr):
+            result = template_runner.run(args[0], **templateman.template_info)
+        record = {
+            'template': args[0],
+            'path': result.template,
+            'status': 'succeeded' if result.succeeded else 'failed',
+            'exit_status': 0 if result.succeeded else 1,
+            'duration': round(result.duration, 6),
+            'files': result.file_stats,
+            'errors': result.errors,
+        }
+        print_records([record], output_format)
+        if not result.succeeded:
+            templateman.abort()
+        return
+
+    if watch and (dry_run or plan_path or profile or profile_path or trace_path):
+        templateman.print_error("Option '--watch' can't be combined with '--dry-run' or the profiling options")
+        templateman.abort()
+        return
+
+    plan = None
+    if dry_run or plan_path:
+        if incremental or staged:
+            templateman.print_error("Option '--dry-run' can't be combined with '--incremental' or '--staged'")
+            templateman.abort()
+            return
+        import templateman.planning as planning
+        plan = planning.Plan(filepath, templateman.template_info)
+
+    if watch:
+        import templateman.watching as watching
+        running = templateman.running
+
+        def run_once():
+            # Aborting ends only this run, the watch continues
+            templateman.running = running
+            try:
+                execute_template_file(filepath, filename, use_cache, incremental, staged, copy_strategy)
+            except SystemExit:
+                pass
+            finally:
+                templateman.running = running
+
+        watching.watch_template(filepath, run_once)
+        return
+
+    profiler = None
+    cprofile = None
+    if profile or profile_path or trace_path:
+        import templateman.profiling as profiling
+        profiler = profiling.Profiler()
+        profiler.add_span('resolve', 'phase', resolve_start, resolve_end, { 'template': filepath })
+        if profile_path:
+            import cProfile
+            cprofile = cProfile.Profile()
+
+    if profiler is None and plan is None:
+        execute_template_file(filepath, filename, use_cache, incremental, staged, copy_strategy)
+        return
+
+    templateman.profiler = profiler
+    templateman.plan = plan
+    succeeded = False
+    try:
+        succeeded = execute_template_file(filepath, filename, use_cache, incremental, staged, copy_strategy, cprofile)
+    finally:
+        templateman.profiler = None
+        templateman.plan = None
+        if plan is not None:
+            report_plan(plan, plan_path if succeeded else None)
+        if profiler is not None:
+            report_profile(profiler, cprofile, profile_path, trace_path)
+
+
+@register_command('run-batch')
+def run_template_batch(args: types.List[str]):
+    """
+    Execute a template script once for every row of a manifest file. The template
+    is resolved and compiled only once. Each row is an object of template info
+    values, for example {"name": "foo", "author": "bar"}. The manifest can be
+    a JSON list (.json), newline delimited JSON (.ndjson / .jsonl) or a CSV
+    table with a header row (.csv).
+
+    USAGE:
+
+        $ python -m templateman run-batch [template-name] [manifest] [arguments]
+
+    ARGUMENTS:
+        -o / --output-directory: Provide a default output directory for rows
+                                 that don't specify one. Default value is the
+                                 current working directory.
+
+        -j / --jobs: Provide the number of worker processes used for executing
+                     the rows in parallel. Each worker has its own template
+                     info and working directory, and aborting a row fails
+                     only that row. Default value is 1.
+
+        --no-cache: Always compile the script from source instead of using
+                    the cached bytecode in the template directory.
+
+    """
+    if len(args) < 2:
+        templateman.print_error("Command 'run-batch' expected atleast two arguments")
+        templateman.abort()
+        return
+
+    filepath, filename, error = resolve_template_path(args[0])
+    if error:
+        templateman.print_error(error)
+        templateman.abort()
+        return
+
+    manifest_path = os.path.join(templateman.working_dir, args[1])
+    output_directory = templateman.working_dir
+    use_cache = True
+    jobs = 1
+
+    def set_output_directory(args: types.List[str]):
+        nonlocal output_directory
+        output_directory = args[0]
+
+    def set_jobs(args: types.List[str]):
+        nonlocal jobs
+        jobs = int(args[0]) if args[0].isdigit() else 0
+
+    def disable_cache(args: types.List[str]):
+        nonlocal use_cache
+        use_cache = False
+
+    all_options = {
+        '--output-directory': (1, set_output_directory),
+        '-o': (1, set_output_directory),
+
+        '--jobs': (1, set_jobs),
+        '-j': (1, set_jobs),
+
+        '--no-cache': (0, disable_cache),
+    }
+    parse_args(args[2:], all_options)
+
+    if jobs < 1:
+        templateman.print_error('Number of jobs must be a positive integer')
+        templateman.abort()
+        return
+
+    rows, error = load_manifest(manifest_path)
     if error:
-        error_message = f"Can't open file '{filepath}'"
+        error_message = f"Can't read manifest '{manifest_path}':\n"
+        error_message += error
         templateman.print_error(error_message)
         templateman.abort()
         return
 
+    file, error = open_template(filepath)
+    if error:
+        templateman.print_error(error)
+        templateman.abort()
+        return
+
     try:
-        code = file.read() # type: ignore
-        exec(compile(code, filename, 'exec'))
+        code = load_template_code(file, filename, use_cache)
     
     except Exception as err:
-        error_message = 'There were errors during the execution of the script:'
+        error_message = 'There were errors during the compilation of the script:'
         error_message += f'\n{err.__class__.__name__}: {str(err)}'
         templateman.print_error(error_message)
         templateman.abort()
+        return
     
     finally:
         file.close() # type: ignore
+
+    rows = [{ 'output_directory': output_directory, **row } for row in rows]
+    if jobs > 1:
+        results = run_batch_parallel(filepath, filename, use_cache, rows, jobs)
+    else:
+        results = (run_batch_row(code, filepath, info) for info in rows)
+
+    failed = 0
+    start = time.perf_counter()
+    for i, (info, (success, error, duration)) in enumerate(zip(rows, results), 1):
+        status = 'OK' if success else 'FAILED'
+        print(f'[ {status} ] {i}/{len(rows)} {info.get("name", "UNKNOWN")} ({duration * 1000:.2f} ms)')
+        if not success:
+            failed += 1
+            print(f'  {error}')
+
+    reset_template_info(dict())
+    duration = time.perf_counter() - start
+    print(f'Executed {len(rows)} rows in {duration:.2f} s: {len(rows) - failed} succeeded, {failed} failed')
+    if failed:
+        templateman.print_error(f'{failed} of {len(rows)} rows failed')
+        templateman.abort()
+        return
+
+
+register_lazy_command('serve', 'templateman.server', 'serve_templates')
+register_lazy_command('bench', 'templateman.benchmarks', 'run_benchmarks')
+register_lazy_command('apply', 'templateman.planning', 'apply_plan_file')
@@ -0,0 +1,154 @@
+"""
+Client for forwarding commands to a running template server.
+
+This module is imported on every invocation of the cli, so the
+socket module is imported only if a server socket exists.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import sys
+import json
+import stat
+import array
+import struct
+import typing as types
+import templateman
+
+SOCKET_ENV_VAR = 'PY_TEMPLATES_SOCKET'
+FORWARDED_COMMANDS = ('run', 'run-batch')
+LOCAL_OPTIONS = ('--watch',)
+
+HEADER_FORMAT = '<I'
+EXIT_CODE_FORMAT = '<i'
+STREAM_FDS = (0, 1, 2)
+
+
+def is_supported() -> bool:
+    return os.name == 'posix' and hasattr(os, 'fork')
+
+
+def resolve_socket_path() -> types.Optional[str]:
+    """
+    Return the path of the server socket. By default the socket is in
+    the user's runtime directory, or in a private per-user directory
+    inside the temporary directory.
+    """
+    path = os.environ.get(SOCKET_ENV_VAR)
+    if path:
+        return path
+    if not is_supported():
+        return None
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'templateman.sock')
+    temp_dir = os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(temp_dir, f'templateman-{os.getuid()}', 'server.sock')
+
+
+def is_private_directory(path: str) -> bool:
+    """
+    Check that the directory is owned by the current user, and that
+    other users have no access to it.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISDIR(info.st_mode) and info.st_uid == os.getuid() and info.st_mode & 0o077 == 0
+
+
+def is_trusted_socket(path: str) -> bool:
+    """
+    Check that the path is a socket owned by the current user. Other
+    users must not receive the environment and the streams of the client.
+    """
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def peer_uid(sock) -> types.Optional[int]:
+    """
+    Return the user id of the process on the other end of the socket,
+    or None if the platform doesn't support SO_PEERCRED.
+    """
+    import socket
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    _, uid, _ = struct.unpack('3i', credentials)
+    return uid
+
+
+def receive_exactly(sock, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def should_forward(command: str, args: types.List[str]) -> bool:
+    """
+    Check if the command can be forwarded to a server. Watching keeps
+    running until interrupted, so it's always executed in this process.
+    """
+    return command in FORWARDED_COMMANDS and not any(arg in LOCAL_OPTIONS for arg in args)
+
+
+def forward_to_server(command: str, args: types.List[str]) -> types.Optional[int]:
+    """
+    Forward the command to a running server. Returns the exit code of
+    the command, or None if no server is running and the command
+    should be executed in this process.
+    """
+    socket_path = resolve_socket_path()
+    if socket_path is None or not os.path.exists(socket_path):
+        return None
+    if not is_trusted_socket(socket_path):
+        templateman.print_error(f"Ignoring template server socket '{socket_path}' not owned by the current user")
+        return None
+
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        uid = peer_uid(sock)
+    except OSError:
+        sock.close()
+        return None
+    if uid is not None and uid != os.getuid():
+        sock.close()
+        templateman.print_error(f"Ignoring template server on '{socket_path}' run by another user")
+        return None
+
+    with sock:
+        request = {
+            'command': command,
+            'args': args,
+            'cwd': os.getcwd(),
+            'env': dict(os.environ),
+        }
+        payload = json.dumps(request).encode('utf-8')
+        fds = array.array('i', STREAM_FDS)
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sock.sendmsg(
+            [struct.pack(HEADER_FORMAT, len(payload)) + payload],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)]
+            )
+        reply = receive_exactly(sock, struct.calcsize(EXIT_CODE_FORMAT))
+
+    if not reply:
+        templateman.print_error('Template server closed the connection unexpectedly')
+        return 1
+    exit_code, = struct.unpack(EXIT_CODE_FORMAT, reply)
+    return exit_code
@@ -0,0 +1,137 @@
+"""
+Copy strategies for files and directory trees.
+
+    copy:     Copy the file contents with shutil.
+    reflink:  Clone the file contents on filesystems that support
+              copy-on-write (Btrfs, XFS, APFS...), otherwise copy the
+              contents in the kernel with os.copy_file_range.
+    hardlink: Create hard links instead of copies. Only use this for
+              read-only assets, since the copies share their content
+              with the originals.
+    parallel: Copy the files of directory trees with a thread pool.
+
+All strategies fall back to a regular copy if the faster method is
+not supported for the given files.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import shutil
+import typing as types
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # type: ignore
+
+
+STRATEGIES = ('copy', 'reflink', 'hardlink', 'parallel')
+FICLONE = 0x40049409
+PARALLEL_MIN_FILES = 64
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
+
+
+def reflink_file(src: str, dst: str):
+    """
+    Copy the file contents using copy-on-write cloning, or os.copy_file_range.
+    Raises OSError if neither is supported.
+    """
+    with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+                return
+            except OSError:
+                pass
+
+        if not hasattr(os, 'copy_file_range'):
+            raise OSError(f"Can't clone '{src}' on this platform")
+
+        remaining = os.fstat(src_file.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(src_file.fileno(), dst_file.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def reflink_copy2(src: str, dst: str) -> str:
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    try:
+        reflink_file(src, dst)
+        shutil.copystat(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def hardlink_copy2(src: str, dst: str) -> str:
+    if os.path.isdir(dst):
+        dst = os.path.join(dst, os.path.basename(src))
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def copy_tree_parallel(src: str, dst: str, max_workers: types.Optional[int] = None):
+    """
+    Copy the directory tree by creating the directories first and then
+    copying the files with a thread pool. Symbolic links are copied as
+    links. The thread pool is used for trees with at least
+    PARALLEL_MIN_FILES files or PARALLEL_MIN_BYTES bytes, smaller
+    trees are copied faster on a single thread.
+    """
+    files = list()
+    directories = list()
+    total_size = 0
+    for root, dirnames, filenames in os.walk(src):
+        target_root = os.path.join(dst, os.path.relpath(root, src))
+        os.makedirs(target_root, exist_ok=root != src)
+        directories.append((root, target_root))
+        for name in dirnames:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target_root, name))
+        for name in filenames:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target_root, name))
+            else:
+                files.append((path, os.path.join(target_root, name)))
+                total_size += os.path.getsize(path)
+
+    if len(files) < PARALLEL_MIN_FILES and total_size < PARALLEL_MIN_BYTES:
+        for item in files:
+            shutil.copy(*item)
+    else:
+        import concurrent.futures
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            for _ in executor.map(lambda item: shutil.copy(*item), files):
+                pass
+
+    for root, target_root in directories:
+        shutil.copystat(root, target_root)
+
+
+def copy_file(src: str, dst: str, strategy: str = 'copy'):
+    if strategy == 'reflink':
+        reflink_copy2(src, dst)
+    elif strategy == 'hardlink':
+        hardlink_copy2(src, dst)
+    else:
+        shutil.copy(src, dst)
+
+
+def copy_tree(src: str, dst: str, strategy: str = 'copy', max_workers: types.Optional[int] = None):
+    if strategy == 'reflink':
+        shutil.copytree(src, dst, copy_function=reflink_copy2)
+    elif strategy == 'hardlink':
+        shutil.copytree(src, dst, copy_function=hardlink_copy2)
+    elif strategy == 'parallel':
+        copy_tree_parallel(src, dst, max_workers)
+    else:
+        shutil.copytree(src, dst)
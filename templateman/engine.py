@@ -0,0 +1,243 @@
+"""
+A small template engine for generating file contents.
+
+    {{ expression }}               Insert the value of a Python expression.
+    {% for target in iterable %}   Repeat the block for each item.
+    {% endfor %}
+    {% if condition %}             Include the block conditionally.
+    {% elif condition %}
+    {% else %}
+    {% endif %}
+    {# comment #}                  Ignored.
+
+Lines which contain only a {% %} tag or a comment are removed from
+the output entirely, so blocks can be written on their own lines.
+Variables which are not defined are false in conditions, so optional
+variables can be checked with {% if variable %}.
+
+Each template text is compiled once into a Python generator function,
+which yields the output in chunks. The compiled functions are kept in
+an LRU cache keyed by the hash of the template text.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import re
+import ast
+import builtins
+import hashlib
+import collections
+import typing as types
+
+
+CACHE_SIZE = 128
+TAG_PATTERN = re.compile(r'(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})', re.DOTALL)
+
+RenderFunction = types.Callable[[types.Dict[str, types.Any]], types.Iterator[str]]
+compiled_templates: 'collections.OrderedDict[str, RenderFunction]' = collections.OrderedDict()
+
+
+class Undefined:
+    """
+    The value of variables which are not defined. Undefined values are
+    false in conditions, but using them in any other way raises NameError.
+    """
+
+    __slots__ = ('name',)
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def fail(self, *args, **kwargs):
+        raise NameError(f"Template variable '{self.name}' is not defined")
+
+    def __bool__(self) -> bool:
+        return False
+
+    def __getattr__(self, name: str):
+        self.fail()
+
+    __str__ = __iter__ = __len__ = __call__ = __getitem__ = fail
+
+
+def lookup(variables: types.Dict[str, types.Any], name: str) -> types.Any:
+    if name in variables:
+        return variables[name]
+    return getattr(builtins, name, Undefined(name))
+
+
+def tokenize(text: str) -> types.List[types.Tuple[str, str, int]]:
+    """
+    Split the template text into tokens (kind, content, line number),
+    where kind is 'text', 'expression', 'block' or 'comment'. Lines
+    containing only a block tag or a comment are stripped.
+    """
+    parts = TAG_PATTERN.split(text)
+    tokens = list()
+    lineno = 1
+    for i, part in enumerate(parts):
+        if i % 2 == 0:
+            tokens.append(('text', part, lineno))
+        elif part.startswith('{{'):
+            tokens.append(('expression', part[2:-2].strip(), lineno))
+        elif part.startswith('{%'):
+            tokens.append(('block', part[2:-2].strip(), lineno))
+        else:
+            tokens.append(('comment', '', lineno))
+        lineno += part.count('\n')
+
+    previous_stripped = True
+    for i in range(1, len(tokens), 2):
+        if tokens[i][0] not in ('block', 'comment'):
+            previous_stripped = False
+            continue
+        _, before, before_lineno = tokens[i - 1]
+        _, after, after_lineno = tokens[i + 1]
+        line_start = before.rfind('\n') + 1
+        line_end = after.find('\n')
+        at_line_start = before[line_start:].strip(' \t') == '' and (line_start > 0 or previous_stripped)
+        at_line_end = (after if line_end == -1 else after[:line_end]).strip(' \t') == ''
+        previous_stripped = at_line_start and at_line_end
+        if previous_stripped:
+            tokens[i - 1] = ('text', before[:line_start], before_lineno)
+            tokens[i + 1] = ('text', '' if line_end == -1 else after[line_end + 1:], after_lineno)
+    return tokens
+
+
+def parse_expression(source: str, lineno: int) -> ast.Expression:
+    try:
+        return ast.parse(source.strip(), mode='eval')
+    except SyntaxError as err:
+        raise SyntaxError(f"Invalid expression '{source}' on line {lineno}: {err.msg}") from None
+
+
+def free_names(node: ast.AST) -> types.Set[str]:
+    """
+    Return the names an expression reads, excluding the names bound
+    inside comprehensions and lambdas.
+    """
+    loaded = set()
+    bound = set()
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name):
+            (loaded if isinstance(child.ctx, ast.Load) else bound).add(child.id)
+        elif isinstance(child, ast.arg):
+            bound.add(child.arg)
+    return loaded - bound
+
+
+def generate_source(text: str) -> str:
+    """
+    Generate the source code of the render function for the template text.
+    Raises SyntaxError if the template is invalid.
+    """
+    body = list()
+    names: types.Set[str] = set()
+    targets: types.Set[str] = set()
+    blocks: types.List[types.Tuple[str, int]] = list()
+    indent = '    '
+
+    for kind, content, lineno in tokenize(text):
+        if kind == 'text':
+            if content:
+                body.append(f'{indent}yield {content!r}')
+
+        elif kind == 'expression':
+            names.update(free_names(parse_expression(content, lineno)))
+            body.append(f'{indent}yield __str({content.strip()})')
+
+        elif kind == 'block':
+            keyword, _, argument = content.partition(' ')
+            if keyword == 'for':
+                target, separator, iterable = argument.partition(' in ')
+                if not separator:
+                    raise SyntaxError(f"Invalid for block on line {lineno}")
+                target_node = parse_expression(target, lineno).body
+                for node in ast.walk(target_node):
+                    if isinstance(node, ast.Name):
+                        targets.add(node.id)
+                names.update(free_names(parse_expression(iterable, lineno)))
+                body.append(f'{indent}for {target.strip()} in {iterable.strip()}:')
+                blocks.append(('for', lineno))
+                indent += '    '
+                body.append(f'{indent}pass')
+
+            elif keyword == 'if':
+                names.update(free_names(parse_expression(argument, lineno)))
+                body.append(f'{indent}if {argument.strip()}:')
+                blocks.append(('if', lineno))
+                indent += '    '
+                body.append(f'{indent}pass')
+
+            elif keyword in ('elif', 'else'):
+                if not blocks or blocks[-1][0] not in ('if', 'elif'):
+                    raise SyntaxError(f"Unexpected '{keyword}' on line {lineno}")
+                indent = indent[:-4]
+                if keyword == 'elif':
+                    names.update(free_names(parse_expression(argument, lineno)))
+                    body.append(f'{indent}elif {argument.strip()}:')
+                else:
+                    body.append(f'{indent}else:')
+                blocks[-1] = (keyword, blocks[-1][1])
+                indent += '    '
+                body.append(f'{indent}pass')
+
+            elif keyword in ('endfor', 'endif'):
+                expected = ('for',) if keyword == 'endfor' else ('if', 'elif', 'else')
+                if not blocks or blocks[-1][0] not in expected:
+                    raise SyntaxError(f"Unexpected '{keyword}' on line {lineno}")
+                blocks.pop()
+                indent = indent[:-4]
+
+            else:
+                raise SyntaxError(f"Unknown block '{keyword}' on line {lineno}")
+
+    if blocks:
+        keyword, lineno = blocks[-1]
+        raise SyntaxError(f"Block '{keyword}' on line {lineno} is never closed")
+
+    header = ['def render(__variables):']
+    for name in sorted(names - targets):
+        header.append(f'    {name} = __lookup(__variables, {name!r})')
+    return '\n'.join(header + body + ['    yield ""']) + '\n'
+
+
+def compile_template(text: str) -> RenderFunction:
+    """
+    Compile the template text into a render function, which returns a
+    generator yielding the output in chunks. Compiled templates are cached
+    by the hash of the text.
+    """
+    key = hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
+    render = compiled_templates.get(key)
+    if render is not None:
+        compiled_templates.move_to_end(key)
+        return render
+
+    namespace = { '__builtins__': builtins, '__lookup': lookup, '__str': str }
+    exec(compile(generate_source(text), f'<template {key[:12]}>', 'exec'), namespace)
+    render = namespace['render']
+    compiled_templates[key] = render
+    if len(compiled_templates) > CACHE_SIZE:
+        compiled_templates.popitem(last=False)
+    return render
+
+
+def read_template(template: types.Union[str, 'os.PathLike[str]']) -> str:
+    """
+    Return the template text. Path-like objects are read from the file,
+    strings are the template text itself.
+    """
+    if isinstance(template, os.PathLike):
+        with open(template, 'r', encoding='utf-8') as file:
+            return file.read()
+    return template
+
+
+def iter_render(template: types.Union[str, 'os.PathLike[str]'], variables: types.Dict[str, types.Any]) -> types.Iterator[str]:
+    return compile_template(read_template(template))(variables)
+
+
+def render(template: types.Union[str, 'os.PathLike[str]'], variables: types.Dict[str, types.Any]) -> str:
+    return ''.join(iter_render(template, variables))
@@ -0,0 +1,53 @@
+"""
+Exceptions raised by the templateman library API.
+
+All exceptions derive from TemplatemanError. The exceptions raised for
+failed runs carry the RunResult of the run in the result attribute, and
+the exception that caused the failure, if any, as their __cause__.
+
+Author: Valtteri Rajalainen
+"""
+
+import typing as types
+
+
+class TemplatemanError(Exception):
+    """Base class for the errors of the templateman library API."""
+
+
+class TemplateNotFoundError(TemplatemanError):
+    """The template could not be resolved or it does not exist."""
+
+    def __init__(self, template: str, message: str):
+        super().__init__(message)
+        self.template = template
+
+
+class RunError(TemplatemanError):
+    """
+    The template run failed. The message is the error output of the run.
+    """
+
+    def __init__(self, message: str, result: types.Any = None):
+        super().__init__(message)
+        self.result = result
+
+
+class MissingArgumentError(RunError):
+    """A template info value required by the template was not given."""
+
+    @property
+    def arguments(self) -> types.Tuple[str, ...]:
+        return self.result.missing_arguments if self.result is not None else ()
+
+
+class OutputError(RunError):
+    """A templateman helper function failed to write the output."""
+
+
+class TemplateExecutionError(RunError):
+    """The template raised an exception, or it could not be compiled."""
+
+
+class TemplateAbortedError(RunError):
+    """The template aborted or exited without an exception."""
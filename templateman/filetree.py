@@ -0,0 +1,204 @@
+"""
+Declarative file tree templates.
+
+A file tree template is a directory, or a zip archive, containing the
+files to generate. Placeholders like {name} and {author} in the file
+paths and contents are replaced with the values in
+templateman.template_info. Placeholders with unknown keys are left
+as they are, so other braces in the files need no escaping. Files
+which are not valid UTF-8 are copied as they are.
+
+The template is compiled into a render plan, which is cached in the
+template directory. Repeated runs of an unchanged template don't read
+or parse the template files again.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import re
+import struct
+import hashlib
+import zipfile
+import marshal
+import contextlib
+import typing as types
+import templateman
+
+
+PLAN_MAGIC = b'TMPLAN\x01\x00'
+PLACEHOLDER_PATTERN = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+DIRECTORY = 'd'
+TEXT_FILE = 't'
+BINARY_FILE = 'b'
+
+compiled_plans: types.Dict[str, types.Tuple[bytes, tuple]] = dict()
+
+
+def compile_text(text: str) -> types.Tuple[str, ...]:
+    """
+    Split the text into segments. The segments alternate between
+    literal text and placeholder keys, starting and ending with
+    literal text.
+    """
+    return tuple(PLACEHOLDER_PATTERN.split(text))
+
+
+def render_text(segments: types.Tuple[str, ...], info: types.Dict[str, types.Any]) -> str:
+    if len(segments) == 1:
+        return segments[0]
+    parts = list(segments)
+    for i in range(1, len(parts), 2):
+        value = info.get(parts[i])
+        parts[i] = '{' + parts[i] + '}' if value is None else str(value)
+    return ''.join(parts)
+
+
+def iter_directory(path: str) -> types.Iterator[types.Tuple[str, types.Optional[bytes]]]:
+    """
+    Yield tuples (relative path, file content) of the directory tree.
+    The content is None for directories.
+    """
+    for root, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        relroot = os.path.relpath(root, path)
+        for dirname in dirnames:
+            yield os.path.normpath(os.path.join(relroot, dirname)), None
+        for filename in sorted(filenames):
+            with open(os.path.join(root, filename), 'rb') as file:
+                yield os.path.normpath(os.path.join(relroot, filename)), file.read()
+
+
+def iter_archive(path: str) -> types.Iterator[types.Tuple[str, types.Optional[bytes]]]:
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            relpath = os.path.normpath(member.filename)
+            yield relpath, None if member.is_dir() else archive.read(member)
+
+
+def compile_plan(path: str) -> tuple:
+    """
+    Compile the file tree into a render plan. The plan is a tuple of
+    entries (kind, path segments, content), where content is None for
+    directories, segments for text files and bytes for binary files.
+    """
+    entries = iter_directory(path) if os.path.isdir(path) else iter_archive(path)
+    plan = list()
+    for relpath, data in entries:
+        path_segments = compile_text(relpath)
+        if data is None:
+            plan.append((DIRECTORY, path_segments, None))
+            continue
+        try:
+            plan.append((TEXT_FILE, path_segments, compile_text(data.decode('utf-8'))))
+        except UnicodeDecodeError:
+            plan.append((BINARY_FILE, path_segments, data))
+    return tuple(plan)
+
+
+def template_signature(path: str) -> bytes:
+    """
+    Return a signature, which changes when any file in the template
+    is modified. Directories are checked by the mtime and size of each
+    entry, archives by the mtime and size of the archive.
+    """
+    if not os.path.isdir(path):
+        stat = os.stat(path)
+        return struct.pack('<qq', stat.st_mtime_ns, stat.st_size)
+
+    digest = hashlib.sha1()
+    for root, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        for name in [''] + sorted(filenames):
+            stat = os.stat(os.path.join(root, name))
+            digest.update(os.path.join(root, name).encode('utf-8', 'surrogateescape'))
+            digest.update(struct.pack('<qq', stat.st_mtime_ns, stat.st_size))
+    return digest.digest()
+
+
+def read_plan_cache(cache_path: str, header: bytes) -> types.Optional[tuple]:
+    try:
+        with open(cache_path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+
+    if not data.startswith(header):
+        return None
+    try:
+        return marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_plan_cache(cache_path: str, header: bytes, plan: tuple):
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(temp_path, 'wb') as file:
+            file.write(header)
+            file.write(marshal.dumps(plan))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+
+
+def load_plan(path: str, cache_path: types.Optional[str] = None) -> tuple:
+    """
+    Load the render plan of the file tree template. If a cache path is
+    given, the plan is cached in memory and in the given file.
+    """
+    if cache_path is None:
+        return compile_plan(path)
+
+    header = PLAN_MAGIC + template_signature(path)
+    cached_header, plan = compiled_plans.get(cache_path, (None, None))
+    if cached_header == header:
+        return plan
+
+    plan = read_plan_cache(cache_path, header)
+    if plan is None:
+        plan = compile_plan(path)
+        write_plan_cache(cache_path, header, plan)
+    compiled_plans[cache_path] = (header, plan)
+    return plan
+
+
+def render_plan(plan: tuple, info: types.Dict[str, types.Any]) -> types.Tuple[types.List[str], types.List[types.Tuple[str, types.Union[str, bytes]]]]:
+    """
+    Render the plan with the given values. Returns a tuple (directories, files),
+    where the directories are sorted so that parents come before their
+    children. Raises ValueError if a rendered path points outside the
+    output directory.
+    """
+    directories = set()
+    files = list()
+    for kind, path_segments, content in plan:
+        relpath = os.path.normpath(render_text(path_segments, info))
+        if os.path.isabs(relpath) or relpath.split(os.sep)[0] == os.pardir:
+            raise ValueError(f"Rendered path '{relpath}' is outside the output directory")
+
+        parent = relpath if kind == DIRECTORY else os.path.dirname(relpath)
+        while parent and parent not in directories:
+            directories.add(parent)
+            parent = os.path.dirname(parent)
+
+        if kind == TEXT_FILE:
+            files.append((relpath, render_text(content, info)))
+        elif kind == BINARY_FILE:
+            files.append((relpath, content))
+    return sorted(directories), files
+
+
+def render_file_tree(plan: tuple, output_directory: str):
+    """
+    Render the plan with templateman.template_info into the output directory.
+    All paths and contents are rendered before anything is written.
+    """
+    directories, files = render_plan(plan, templateman.template_info)
+    for relpath in directories:
+        templateman.create_directory(os.path.join(output_directory, relpath))
+    for relpath, content in files:
+        templateman.write_file(os.path.join(output_directory, relpath), content)
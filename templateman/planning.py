@@ -0,0 +1,223 @@
+"""
+Dry runs: recording the operations of a template without performing them.
+
+While a plan is active in templateman.plan, the templateman helper
+functions record their operations into it instead of touching the
+filesystem or running commands. The commands are assumed to succeed
+with no output. The plan can be printed, saved as JSON and applied
+later with the 'apply' command.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import json
+import base64
+import typing as types
+import templateman
+
+
+PLAN_FORMAT_VERSION = 1
+
+
+def format_size(size: int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024 # type: ignore
+    return f'{size} B'
+
+
+def tree_size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, filenames in os.walk(path, followlinks=True):
+        for filename in filenames:
+            size += os.path.getsize(os.path.join(root, filename))
+    return size
+
+
+class Plan:
+    """
+    The recorded operations of a template run. Each operation is a dict
+    with the keys 'operation' and 'size' (bytes written), and the
+    arguments of the operation.
+    """
+
+    def __init__(self, template: str = '', info: types.Optional[dict] = None):
+        self.template = template
+        self.info = dict(info or dict())
+        self.operations: types.List[dict] = list()
+
+    def record(self, operation: str, size: int = 0, **arguments):
+        self.operations.append({ 'operation': operation, 'size': size, **arguments })
+
+    def record_directory(self, path: str, create_dirs = False):
+        self.record('create_directory', path=os.path.abspath(path), create_dirs=create_dirs)
+
+    def record_file(self, path: str, content: types.Union[str, bytes, None] = None):
+        if content is None:
+            self.record('create_file', path=os.path.abspath(path))
+        elif isinstance(content, str):
+            size = len(content.encode('utf-8'))
+            self.record('write_file', size, path=os.path.abspath(path), content=content, encoding='utf-8')
+        else:
+            encoded = base64.b64encode(content).decode('ascii')
+            self.record('write_file', len(content), path=os.path.abspath(path), content=encoded, encoding='base64')
+
+    def record_copy(self, src: str, dst: str, strategy: str):
+        try:
+            size = tree_size(src)
+        except OSError:
+            size = 0
+        self.record('copy_item', size, src=os.path.abspath(src), dst=os.path.abspath(dst), strategy=strategy)
+
+    def record_asset(self, bundle_path: str, name: str, dst: str):
+        self.record('copy_asset', bundle=os.path.abspath(bundle_path), name=name, dst=os.path.abspath(dst))
+
+    def record_venv(self, path: str, requirements: types.List[str]):
+        self.record('create_venv', path=os.path.abspath(path), requirements=list(requirements))
+
+    def record_command(self, cmd: types.List[str], path: types.Optional[str] = None):
+        self.record('run_command', cmd=list(cmd), path=os.path.abspath(path) if path else None)
+
+    def totals(self) -> types.Dict[str, int]:
+        totals = { 'directories': 0, 'files': 0, 'commands': 0, 'bytes': 0 }
+        for operation in self.operations:
+            kind = operation['operation']
+            if kind in ('create_directory', 'create_venv'):
+                totals['directories'] += 1
+            elif kind == 'run_command':
+                totals['commands'] += 1
+            else:
+                totals['files'] += 1
+            totals['bytes'] += operation['size']
+        return totals
+
+    def format_summary(self) -> str:
+        lines = ['Planned operations:', '']
+        for operation in self.operations:
+            kind = operation['operation']
+            if kind == 'run_command':
+                target = ' '.join(operation['cmd'])
+                if operation['path']:
+                    target += f"  (in {operation['path']})"
+            elif kind in ('copy_item', 'copy_asset'):
+                source = operation['src'] if kind == 'copy_item' else f"{operation['bundle']}:{operation['name']}"
+                target = f"{source} -> {operation['dst']}"
+            else:
+                target = operation['path']
+            size = f"  [{format_size(operation['size'])}]" if operation['size'] else ''
+            lines.append(f'  {kind:<17} {target}{size}')
+
+        totals = self.totals()
+        lines.extend([
+            '',
+            f"Estimated I/O: {totals['directories']} directories, {totals['files']} files, "
+            f"{format_size(totals['bytes'])} written, {totals['commands']} commands",
+        ])
+        return '\n'.join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            'version': PLAN_FORMAT_VERSION,
+            'template': self.template,
+            'info': self.info,
+            'operations': self.operations,
+        }
+
+    def write(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+
+
+def load_plan(path: str) -> types.Tuple[types.Optional[Plan], types.Optional[str]]:
+    try:
+        with open(path, 'r') as file:
+            data = json.load(file)
+        if data.get('version') != PLAN_FORMAT_VERSION:
+            return None, f"Unsupported plan format version '{data.get('version')}'"
+        plan = Plan(data.get('template', ''), data.get('info'))
+        plan.operations = list(data['operations'])
+        return plan, None
+    except Exception as err:
+        return None, f'{err.__class__.__name__}: {str(err)}'
+
+
+def apply_operation(operation: dict):
+    kind = operation['operation']
+    if kind == 'create_directory':
+        templateman.create_directory(operation['path'], operation.get('create_dirs', False))
+
+    elif kind == 'create_file':
+        templateman.create_file(operation['path'])
+
+    elif kind == 'write_file':
+        content = operation['content']
+        if operation.get('encoding') == 'base64':
+            content = base64.b64decode(content)
+        templateman.write_file(operation['path'], content)
+
+    elif kind == 'copy_item':
+        templateman.copy_item(operation['src'], operation['dst'], operation['strategy'])
+
+    elif kind == 'copy_asset':
+        import templateman.bundles as bundles
+        bundle = bundles.open_bundle(operation['bundle'])
+        if bundle is None:
+            raise FileNotFoundError(f"No template bundle in '{operation['bundle']}'")
+        previous_bundle = templateman.template_bundle
+        templateman.template_bundle = bundle
+        try:
+            templateman.copy_asset(operation['name'], operation['dst'])
+        finally:
+            templateman.template_bundle = previous_bundle
+            bundle.close()
+
+    elif kind == 'create_venv':
+        templateman.create_venv(operation['path'], operation['requirements'])
+
+    elif kind == 'run_command':
+        returncode, output = templateman.run_command(operation['cmd'], operation['path'])
+        if returncode != 0:
+            raise RuntimeError(f"Command '{' '.join(operation['cmd'])}' failed with exit code {returncode}:\n{output}")
+
+    else:
+        raise ValueError(f"Unknown operation '{kind}'")
+
+
+def apply_plan_file(args: types.List[str]):
+    """
+    Perform the operations of a plan recorded with 'run --dry-run'.
+    The operations are performed in the recorded order, and the plan
+    is aborted if any of them fails.
+
+    USAGE:
+
+        $ python -m templateman apply [plan-file]
+
+    """
+    if len(args) < 1:
+        templateman.print_error("Command 'apply' expected atleast one argument")
+        templateman.abort()
+        return
+
+    path = os.path.join(templateman.working_dir, args[0])
+    plan, error = load_plan(path)
+    if error:
+        error_message = f"Can't read plan '{path}':\n"
+        error_message += error
+        templateman.print_error(error_message)
+        templateman.abort()
+        return
+
+    for i, operation in enumerate(plan.operations, 1): # type: ignore
+        try:
+            apply_operation(operation)
+        except Exception as err:
+            error_message = f'Operation {i} of {len(plan.operations)} failed:\n' # type: ignore
+            error_message += f'{err.__class__.__name__}: {str(err)}'
+            templateman.print_error(error_message)
+            templateman.abort()
+            return
@@ -0,0 +1,96 @@
+"""
+Wall time profiling for template runs.
+
+The profiler records spans for the phases of a run and for the calls
+of the templateman helper functions. The spans can be summarized, or
+written as a Chrome trace event file, which can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import json
+import time
+import threading
+import contextlib
+import typing as types
+
+
+class Span(types.NamedTuple):
+    name: str
+    category: str
+    start: float
+    duration: float
+    details: types.Dict[str, str]
+    thread: int
+
+
+class Profiler:
+    """
+    Records wall time spans. The start times are stored relative to the
+    creation of the profiler.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.spans: types.List[Span] = list()
+
+    def add_span(self, name: str, category: str, start: float, end: float, details: types.Optional[dict] = None):
+        """
+        Record a span. The start and end are values of time.perf_counter().
+        """
+        span = Span(name, category, start - self.origin, end - start, details or dict(), threading.get_ident())
+        self.spans.append(span)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str, details: types.Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time.perf_counter(), details)
+
+    def totals(self) -> types.List[types.Tuple[str, str, float, int]]:
+        """
+        Return tuples (category, name, total duration, number of calls)
+        sorted by the total duration.
+        """
+        totals: types.Dict[types.Tuple[str, str], types.List] = dict()
+        for span in self.spans:
+            total = totals.setdefault((span.category, span.name), [0.0, 0])
+            total[0] += span.duration
+            total[1] += 1
+        items = [(category, name, duration, calls) for (category, name), (duration, calls) in totals.items()]
+        return sorted(items, key=lambda item: item[2], reverse=True)
+
+    def format_summary(self, slowest: int = 10) -> str:
+        lines = ['Profile (wall time):', '']
+        for category, name, duration, calls in self.totals():
+            lines.append(f"  {category:<7} {name:<24} {duration * 1000:10.3f} ms {calls:6} calls")
+
+        helper_spans = [span for span in self.spans if span.category == 'helper']
+        if helper_spans:
+            lines.extend(['', 'Slowest helper calls:', ''])
+            for span in sorted(helper_spans, key=lambda span: span.duration, reverse=True)[:slowest]:
+                details = ', '.join(f'{key}={value}' for key, value in span.details.items())
+                lines.append(f"  {span.duration * 1000:10.3f} ms  {span.name}({details})")
+        return '\n'.join(lines)
+
+    def write_chrome_trace(self, path: str):
+        pid = os.getpid()
+        events = [
+            {
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': span.start * 1_000_000,
+                'dur': span.duration * 1_000_000,
+                'pid': pid,
+                'tid': span.thread,
+                'args': span.details,
+            }
+            for span in self.spans
+        ]
+        with open(path, 'w') as file:
+            json.dump({ 'traceEvents': events, 'displayTimeUnit': 'ms' }, file)
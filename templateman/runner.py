@@ -0,0 +1,183 @@
+"""
+Running templates repeatedly inside one process.
+
+The templateman helper functions use the module level state in the
+templateman package: template_info, working_dir, file_stats and so on.
+A Runner gives each run its own RunContext, installs it into the module
+for the duration of the run and restores the previous state afterwards.
+Errors and aborts end only the run, and they are returned in a RunResult
+instead of exiting the process.
+
+    runner = templateman.Runner(incremental=True)
+    result = runner.run('py_project', name='example', author='me')
+    if not result.succeeded:
+        print(result.error)
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import time
+import typing as types
+import templateman
+import templateman.cli as cli
+
+
+class RunResult(types.NamedTuple):
+    template: str
+    info: types.Dict[str, types.Any]
+    succeeded: bool
+    errors: types.List[str]
+    file_stats: types.Dict[str, int]
+    duration: float
+    exception: types.Optional[BaseException] = None
+    missing_arguments: types.Tuple[str, ...] = ()
+    include_graph: types.Optional[types.Dict[str, types.List[str]]] = None
+    output_error: types.Optional[OSError] = None
+
+    @property
+    def error(self) -> types.Optional[str]:
+        return '\n'.join(self.errors) if self.errors else None
+
+
+class RunContext:
+    """
+    The state of a single run. The active context is available to the
+    template in templateman.context.
+    """
+
+    def __init__(self, info: types.Dict[str, types.Any], working_dir: str, quiet = False):
+        self.info = {
+            'name':             'UNKNOWN',
+            'output_directory': working_dir,
+            'author':           'UNKNOWN',
+            **info,
+        }
+        self.working_dir = working_dir
+        self.quiet = quiet
+        self.errors: types.List[str] = list()
+        self.missing_arguments: types.List[str] = list()
+        self.output_error: types.Optional[OSError] = None
+        self.include_graph: types.Dict[str, types.List[str]] = dict()
+        self.file_stats: types.Dict[str, int] = { 'created': 0, 'updated': 0, 'unchanged': 0 }
+
+
+def swap_module_state(state: types.Dict[str, types.Any]) -> types.Dict[str, types.Any]:
+    """
+    Set the given attributes of the templateman module and return their
+    previous values. The template_info dict is updated in place, since
+    templates may hold references to it.
+    """
+    previous = dict()
+    for name, value in state.items():
+        if name == 'template_info':
+            previous[name] = dict(templateman.template_info)
+            templateman.template_info.clear()
+            templateman.template_info.update(value)
+        else:
+            previous[name] = getattr(templateman, name)
+            setattr(templateman, name, value)
+    return previous
+
+
+class Runner:
+    """
+    Runs templates in fresh module namespaces with the given run options.
+    The compiled templates are cached between runs, so one runner can be
+    used for any number of runs. By default errors are only collected in
+    the results, pass quiet=False to also print them to stderr.
+    """
+
+    def __init__(
+        self,
+        use_cache = True,
+        incremental = False,
+        staged = False,
+        copy_strategy = 'copy',
+        working_dir: types.Optional[str] = None,
+        quiet = True
+        ):
+        self.use_cache = use_cache
+        self.incremental = incremental
+        self.staged = staged
+        self.copy_strategy = copy_strategy
+        self.working_dir = working_dir
+        self.quiet = quiet
+
+    def resolve(self, template: str) -> types.Tuple[str, str, types.Optional[str]]:
+        """
+        Resolve the path of the template like in the 'run' command.
+        Returns a tuple (filepath, filename, error).
+        """
+        working_dir = templateman.working_dir
+        templateman.working_dir = self.working_dir or os.getcwd()
+        try:
+            filepath, filename, error = cli.resolve_template_path(template)
+        finally:
+            templateman.working_dir = working_dir
+        if error is None and not os.path.exists(filepath):
+            error = f"Can't find file '{filepath}'"
+        return filepath, filename, error
+
+    def run(self, template: str, **info) -> RunResult:
+        """
+        Run the template with the given template info values. The template
+        is resolved like in the 'run' command.
+        """
+        filepath, filename, error = self.resolve(template)
+        if error:
+            context = RunContext(info, self.working_dir or os.getcwd(), self.quiet)
+            context.errors.append(error)
+            if not self.quiet:
+                templateman.print_error(error)
+            return RunResult(filepath, context.info, False, context.errors, context.file_stats, 0.0)
+        return self.run_file(filepath, filename, info)
+
+    def run_file(self, filepath: str, filename: str, info: types.Dict[str, types.Any]) -> RunResult:
+        """
+        Run the template resolved with Runner.resolve with the given
+        template info values.
+        """
+        context = RunContext(info, self.working_dir or os.getcwd(), self.quiet)
+        cwd = os.getcwd()
+        previous = swap_module_state({
+            'context':           context,
+            'running':           True,
+            'template_info':     context.info,
+            'working_dir':       context.working_dir,
+            'file_stats':        context.file_stats,
+            'include_stack':     list(),
+            'include_graph':     context.include_graph,
+            'incremental':       False,
+            'copy_strategy':     self.copy_strategy,
+            'profiler':          None,
+            'plan':              None,
+            'template_bundle':   None,
+            'staging_directory': None,
+            'staging_target':    None,
+        })
+        succeeded = False
+        exception = None
+        start = time.perf_counter()
+        try:
+            succeeded = cli.execute_template_file(
+                filepath, filename, self.use_cache, self.incremental, self.staged, self.copy_strategy
+                )
+
+        except SystemExit as exit:
+            # Staged output is discarded on any exit
+            succeeded = exit.code in (None, 0) and not context.errors and not self.staged
+            # Helpers abort while handling the error that caused the abort
+            exception = exit.__context__
+
+        finally:
+            duration = time.perf_counter() - start
+            context.info = dict(templateman.template_info)
+            swap_module_state(previous)
+            os.chdir(cwd)
+
+        return RunResult(
+            filepath, context.info, succeeded, context.errors, context.file_stats,
+            duration, exception, tuple(context.missing_arguments), context.include_graph,
+            context.output_error
+            )
@@ -0,0 +1,201 @@
+"""
+A persistent server for running templates without paying the
+interpreter startup and import costs on every invocation.
+
+The server listens on a local Unix socket. Clients send their
+command line arguments, working directory, environment and standard
+stream file descriptors. The server forks a worker for each request,
+which executes the command with the client's streams and reports
+the exit code back.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import sys
+import json
+import array
+import socket
+import signal
+import struct
+import typing as types
+import templateman
+import templateman.cli as cli
+import templateman.client as client
+from templateman.client import (
+    HEADER_FORMAT,
+    EXIT_CODE_FORMAT,
+    STREAM_FDS,
+    resolve_socket_path,
+    is_private_directory,
+    receive_exactly,
+    is_supported,
+    )
+
+
+def receive_request(conn: socket.socket) -> types.Tuple[dict, types.List[int]]:
+    fds = array.array('i')
+    header_size = struct.calcsize(HEADER_FORMAT)
+    data, ancdata, _, _ = conn.recvmsg(4096, socket.CMSG_SPACE(len(STREAM_FDS) * fds.itemsize))
+    for level, kind, cmsg_data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(cmsg_data[:len(cmsg_data) - (len(cmsg_data) % fds.itemsize)])
+
+    if len(data) < header_size:
+        data += receive_exactly(conn, header_size - len(data))
+    size, = struct.unpack(HEADER_FORMAT, data[:header_size])
+    payload = data[header_size:]
+    payload += receive_exactly(conn, size - len(payload))
+    return json.loads(payload.decode('utf-8')), list(fds)
+
+
+def handle_request(conn: socket.socket, exec_command: types.Callable[[str, types.List[str]], None]) -> int:
+    request, fds = receive_request(conn)
+    for target_fd, fd in zip(STREAM_FDS, fds):
+        os.dup2(fd, target_fd)
+        os.close(fd)
+
+    cwd = request['cwd']
+    os.chdir(cwd)
+    os.environ.clear()
+    os.environ.update(request['env'])
+    templateman.working_dir = cwd
+    templateman.template_info['output_directory'] = cwd
+    templateman.running = True
+
+    exit_code = 0
+    try:
+        exec_command(request['command'], request['args'])
+
+    except SystemExit as exc:
+        exit_code = 0 if exc.code is None else exc.code if isinstance(exc.code, int) else 1
+
+    except Exception as err:
+        templateman.print_error(f'{err.__class__.__name__}: {str(err)}')
+        exit_code = 1
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn.sendall(struct.pack(EXIT_CODE_FORMAT, exit_code))
+    return exit_code
+
+
+def is_server_running(socket_path: str) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(socket_path: str, exec_command: types.Callable[[str, types.List[str]], None]):
+    """
+    Accept requests until interrupted. Each request is handled in a
+    forked worker process, so the state of the server is never modified
+    by the executed templates.
+    """
+    directory = os.path.dirname(os.path.abspath(socket_path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700)
+
+    if os.path.exists(socket_path):
+        if is_server_running(socket_path):
+            raise RuntimeError(f"Server already running on '{socket_path}'")
+        os.remove(socket_path)
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(socket_path)
+        os.chmod(socket_path, 0o600)
+        server.listen(64)
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        while True:
+            conn, _ = server.accept()
+            pid = os.fork()
+            if pid == 0:
+                exit_code = 1
+                try:
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    signal.signal(signal.SIGINT, signal.SIG_DFL)
+                    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                    server.close()
+                    exit_code = handle_request(conn, exec_command)
+                finally:
+                    os._exit(exit_code)
+            conn.close()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def serve_templates(args: types.List[str]):
+    """
+    Start a template server. While the server is running, the 'run' command
+    is forwarded to it, which avoids the interpreter startup and import
+    costs. Installed templates are compiled once when the server starts.
+    Stop the server with Ctrl+C.
+
+    USAGE:
+
+        $ python -m templateman serve [arguments]
+
+    ARGUMENTS:
+        -s / --socket: Provide a path for the Unix socket the server listens on.
+                       Default value is read from the PY_TEMPLATES_SOCKET
+                       environment variable, or a socket in $XDG_RUNTIME_DIR,
+                       or in a private per-user directory in the temporary
+                       directory.
+
+    """
+    socket_path = resolve_socket_path()
+    default_path = socket_path is not None and not os.environ.get(client.SOCKET_ENV_VAR)
+
+    def set_socket_path(args: types.List[str]):
+        nonlocal socket_path, default_path
+        socket_path = args[0]
+        default_path = False
+
+    all_options = {
+        '--socket': (1, set_socket_path),
+        '-s': (1, set_socket_path),
+    }
+    cli.parse_args(args, all_options)
+
+    if socket_path is None or not is_supported():
+        templateman.print_error('Template server is not supported on this platform')
+        templateman.abort()
+        return
+
+    if default_path:
+        directory = os.path.dirname(socket_path)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        except OSError:
+            pass
+        if not is_private_directory(directory):
+            templateman.print_error(f"Socket directory '{directory}' must be owned by the current user with mode 0700")
+            templateman.abort()
+            return
+
+    loaded = 0
+    template_dir = cli.resolve_template_directory()
+    if template_dir is not None and os.path.isdir(template_dir):
+        loaded = cli.preload_installed_templates(template_dir)
+
+    print(f"Serving templates on '{socket_path}' ({loaded} templates loaded)")
+    try:
+        serve(socket_path, cli.exec_command)
+    except (OSError, RuntimeError) as err:
+        templateman.print_error(f"Can't start template server:\n{err.__class__.__name__}: {str(err)}")
+        templateman.abort()
+        return
@@ -0,0 +1,141 @@
+"""
+Content-addressed storage for installed templates.
+
+The content of each installed template is stored once as a blob in the
+__tmstore__ directory inside the template directory, named by the
+SHA-256 hash of the content. The installed templates are symbolic links
+to these blobs, so the store is the only copy of the data. Installing
+the same content under many names, or installing the same content
+again, doesn't copy any data. The hash of an installed template is read
+from the name of the blob it links to, without reading the content.
+
+The blobs are read-only. Editors which save files by replacing them
+replace the link with a regular file, which leaves the blob and the
+other templates linked to it untouched. On platforms without symbolic
+links, the installed templates are copies of the blobs instead, cloned
+with copy-on-write where the filesystem supports it.
+
+Blobs which are not linked to any installed template are removed by
+collect_garbage.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import contextlib
+import typing as types
+import templateman
+import templateman.copying as copying
+
+
+STORE_DIRECTORY_NAME = '__tmstore__'
+
+
+def resolve_store_directory(template_dir: str) -> str:
+    return os.path.join(template_dir, STORE_DIRECTORY_NAME)
+
+
+def blob_path(store_dir: str, digest: str) -> str:
+    return os.path.join(store_dir, digest[:2], digest[2:])
+
+
+def add_blob(store_dir: str, path: str, move = False) -> str:
+    """
+    Add the file into the store and return the path of the blob. If a blob
+    with the same content already exists, nothing is copied. If move is true,
+    the file is moved into the store instead of copying it. Concurrent calls
+    adding the same content all succeed.
+    """
+    digest = templateman.file_digest(path).hex()
+    blob = blob_path(store_dir, digest)
+    if os.path.exists(blob):
+        if move:
+            os.remove(path)
+        return blob
+
+    os.makedirs(os.path.dirname(blob), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(blob))
+    os.close(fd)
+    try:
+        if move:
+            os.replace(path, temp_path)
+        else:
+            shutil.copyfile(path, temp_path)
+        os.chmod(temp_path, 0o444)
+        try:
+            os.replace(temp_path, blob)
+        except OSError:
+            if not os.path.exists(blob):
+                raise
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+    return blob
+
+
+def linked_blob(path: str) -> types.Optional[str]:
+    """
+    Return the digest of the blob the installed template links to, or
+    None if the path is not a link into the store.
+    """
+    try:
+        target = os.readlink(path)
+    except OSError:
+        return None
+    parts = os.path.normpath(target).split(os.sep)
+    if len(parts) != 3 or parts[0] != STORE_DIRECTORY_NAME:
+        return None
+    return parts[1] + parts[2]
+
+
+def link_blob(blob: str, path: str) -> bool:
+    """
+    Replace the file in the given path with a link to the blob. Returns
+    False if the path is already linked to the blob.
+    """
+    target = os.path.relpath(blob, os.path.dirname(path))
+    with contextlib.suppress(OSError):
+        if os.readlink(path) == target:
+            return False
+
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        try:
+            os.symlink(target, temp_path)
+        except (OSError, NotImplementedError):
+            try:
+                copying.reflink_file(blob, temp_path)
+            except OSError:
+                shutil.copyfile(blob, temp_path)
+        os.replace(temp_path, path)
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+    return True
+
+
+def collect_garbage(store_dir: str, referenced: types.Set[str]) -> int:
+    """
+    Remove the blobs whose digest is not in the referenced digests.
+    Returns the number of removed blobs.
+    """
+    removed = 0
+    if not os.path.isdir(store_dir):
+        return removed
+
+    for prefix in os.listdir(store_dir):
+        prefix_dir = os.path.join(store_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.endswith('.tmp') or prefix + name in referenced:
+                continue
+            with contextlib.suppress(OSError):
+                os.remove(os.path.join(prefix_dir, name))
+                removed += 1
+        with contextlib.suppress(OSError):
+            os.rmdir(prefix_dir)
+    return removed
@@ -0,0 +1,142 @@
+"""
+Cached virtual environments for project templates.
+
+Creating a virtual environment and installing packages into it takes
+seconds. The base environments are built once for each combination of
+interpreter and requirements, and stored in a cache directory. New
+environments are cloned from the cached ones, and the absolute paths
+of the cached environment are replaced in the scripts and the config
+files which contain them.
+
+The cache directory is read from the PY_TEMPLATES_VENV_CACHE environment
+variable. By default it is templateman/venvs inside the user's cache
+directory.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import sys
+import shutil
+import hashlib
+import subprocess
+import typing as types
+import templateman.copying as copying
+
+
+VENV_CACHE_ENV_VAR = 'PY_TEMPLATES_VENV_CACHE'
+SCRIPTS_DIRECTORY_NAME = 'Scripts' if os.name == 'nt' else 'bin'
+
+
+def resolve_cache_directory() -> str:
+    path = os.environ.get(VENV_CACHE_ENV_VAR)
+    if path:
+        return path
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'templateman', 'venvs')
+
+
+def environment_key(requirements: types.Iterable[str]) -> str:
+    """
+    Return the cache key of the base environment for the running
+    interpreter and the given requirements.
+    """
+    digest = hashlib.sha256()
+    digest.update(os.path.realpath(sys.executable).encode('utf-8'))
+    digest.update(sys.version.encode('utf-8'))
+    for requirement in sorted(set(' '.join(requirement.split()) for requirement in requirements)):
+        digest.update(b'\0' + requirement.encode('utf-8'))
+    return digest.hexdigest()[:24]
+
+
+def interpreter_path(venv_path: str) -> str:
+    name = 'python.exe' if os.name == 'nt' else 'python'
+    return os.path.join(venv_path, SCRIPTS_DIRECTORY_NAME, name)
+
+
+def build_environment(path: str, requirements: types.List[str]):
+    """
+    Create a new virtual environment and install the requirements into it.
+    Raises RuntimeError if either step fails.
+    """
+    commands = [[sys.executable, '-m', 'venv', path]]
+    if requirements:
+        commands.append([interpreter_path(path), '-m', 'pip', 'install', '--disable-pip-version-check', *requirements])
+
+    for cmd in commands:
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Command '{' '.join(cmd)}' failed with exit code {proc.returncode}:\n{proc.stdout}")
+
+
+def cached_environment(requirements: types.List[str], cache_dir: types.Optional[str] = None) -> str:
+    """
+    Return the path of the cached base environment, building it first
+    if it doesn't exist yet. The environment is built in a temporary
+    directory and moved into place when it is complete.
+    """
+    cache_dir = cache_dir or resolve_cache_directory()
+    path = os.path.join(cache_dir, environment_key(requirements))
+    if os.path.isdir(path):
+        return path
+
+    os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        build_environment(temp_path, requirements)
+        fix_environment_paths(temp_path, temp_path, path)
+        try:
+            os.rename(temp_path, path)
+        except OSError:
+            if not os.path.isdir(path):
+                raise
+    finally:
+        if os.path.exists(temp_path):
+            shutil.rmtree(temp_path, ignore_errors=True)
+    return path
+
+
+def replace_in_file(path: str, old: bytes, new: bytes):
+    """
+    Replace the bytes in the file. The file is replaced with a new one
+    instead of modifying it in place, since it may be linked to the
+    cached environment.
+    """
+    with open(path, 'rb') as file:
+        data = file.read()
+    if old not in data:
+        return
+
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(data.replace(old, new))
+    shutil.copymode(path, temp_path)
+    os.replace(temp_path, path)
+
+
+def fix_environment_paths(venv_path: str, old_path: str, new_path: str):
+    """
+    Replace the old path of the environment with the new path in the
+    scripts and in pyvenv.cfg.
+    """
+    old = os.path.abspath(old_path).encode('utf-8')
+    new = os.path.abspath(new_path).encode('utf-8')
+    paths = [os.path.join(venv_path, 'pyvenv.cfg')]
+    scripts_dir = os.path.join(venv_path, SCRIPTS_DIRECTORY_NAME)
+    for name in os.listdir(scripts_dir):
+        paths.append(os.path.join(scripts_dir, name))
+
+    for path in paths:
+        if os.path.isfile(path) and not os.path.islink(path):
+            replace_in_file(path, old, new)
+
+
+def clone_environment(src: str, dst: str):
+    """
+    Clone the cached environment into the destination. Symbolic links
+    are preserved, and the files are cloned with reflinks where the
+    filesystem supports them. Hard links are never used, since packages
+    installed into the clone would modify the cached environment.
+    """
+    shutil.copytree(src, dst, symlinks=True, copy_function=copying.reflink_copy2)
+    fix_environment_paths(dst, src, dst)
@@ -0,0 +1,228 @@
+"""
+Watching templates for changes.
+
+On Linux the template is watched with inotify, which is accessed with
+ctypes. On other platforms, or if inotify is not available, the files
+are polled for changes in their modification times and sizes.
+
+Single file templates are watched by watching their parent directory,
+since editors often save files by replacing them. Directory templates
+are watched recursively.
+
+Author: Valtteri Rajalainen
+"""
+
+import os
+import sys
+import time
+import ctypes
+import ctypes.util
+import select
+import struct
+import typing as types
+
+
+DEBOUNCE_DELAY = 0.1
+POLL_INTERVAL = 0.25
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+    IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    )
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def watch_targets(path: str) -> types.Tuple[types.List[str], types.Optional[str]]:
+    """
+    Return the directories to watch for the given template, and the name
+    of the watched file in them, or None if all files are watched.
+    """
+    path = os.path.abspath(path)
+    if not os.path.isdir(path):
+        return [os.path.dirname(path)], os.path.basename(path)
+
+    directories = list()
+    for root, dirnames, _ in os.walk(path):
+        dirnames[:] = [name for name in dirnames if name != '__pycache__']
+        directories.append(root)
+    return directories, None
+
+
+class PollingWatcher:
+    """
+    Detect changes by comparing the modification times and sizes
+    of the watched files.
+    """
+
+    def __init__(self, path: str, interval: float = POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.snapshot = self.take_snapshot()
+
+    def take_snapshot(self) -> types.Dict[str, types.Tuple[int, int]]:
+        directories, name = watch_targets(self.path)
+        snapshot = dict()
+        for directory in directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if (name is None or entry.name == name) and entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def wait(self, timeout: types.Optional[float] = None) -> bool:
+        """
+        Wait until the watched files change, or the timeout expires.
+        Returns True if there were changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            snapshot = self.take_snapshot()
+            if snapshot != self.snapshot:
+                self.snapshot = snapshot
+                return True
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                time.sleep(min(self.interval, remaining))
+            else:
+                time.sleep(self.interval)
+
+    def refresh(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Detect changes with the Linux inotify API. Raises OSError if inotify
+    is not available.
+    """
+
+    def __init__(self, path: str):
+        libc_name = ctypes.util.find_library('c')
+        if libc_name is None:
+            raise OSError('C library not found')
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify is not supported')
+
+        self.libc = libc
+        self.path = path
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.name: types.Optional[str] = None
+        try:
+            self.refresh()
+        except OSError:
+            self.close()
+            raise
+
+    def refresh(self):
+        """
+        Add watches for the current directories of the template.
+        Directories that are already watched are ignored by the kernel.
+        """
+        directories, self.name = watch_targets(self.path)
+        for directory in directories:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno), directory)
+
+    def read_events(self) -> bool:
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+                offset += length
+                if self.name is None or name == self.name or mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                    changed = True
+
+    def wait(self, timeout: types.Optional[float] = None) -> bool:
+        """
+        Wait until the watched files change, or the timeout expires.
+        Returns True if there were changes.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            readable, _, _ = select.select([self.fd], [], [], remaining)
+            if readable and self.read_events():
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def create_watcher(path: str) -> types.Union[InotifyWatcher, PollingWatcher]:
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(path)
+
+
+def wait_for_changes(watcher: types.Union[InotifyWatcher, PollingWatcher], debounce: float = DEBOUNCE_DELAY):
+    """
+    Wait until the watched files change, and then until no more changes
+    arrive within the debounce delay. Editors and version control tools
+    often write many files in a burst, which then causes only one run.
+    """
+    watcher.wait()
+    while watcher.wait(debounce):
+        pass
+    watcher.refresh()
+
+
+def watch_template(path: str, run: types.Callable[[], types.Any]):
+    """
+    Call run, and call it again every time the template changes,
+    until interrupted with Ctrl+C.
+    """
+    watcher = create_watcher(path)
+    try:
+        while True:
+            run()
+            print(f"Watching '{path}' for changes, press Ctrl+C to stop...")
+            wait_for_changes(watcher)
+            print('Changes detected, running the template again...')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,92 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import templateman
+import templateman.api as api
+import templateman.errors as errors
+
+
+SCRIPT_TEXT = """
+import os
+import templateman
+
+templateman.require_arguments('name')
+templateman.create_directory(os.path.join(templateman.template_info['output_directory'], templateman.template_info['name']))
+"""
+
+
+def write_scripts(dir_path: str):
+    with open(os.path.join(dir_path, 'script.py'), 'w') as file:
+        file.write(SCRIPT_TEXT)
+    with open(os.path.join(dir_path, 'broken.py'), 'w') as file:
+        file.write('raise ValueError("broken")')
+    with open(os.path.join(dir_path, 'reading.py'), 'w') as file:
+        file.write('open("missing.txt")')
+    with open(os.path.join(dir_path, 'arguments.py'), 'w') as file:
+        file.write('import templateman\ntemplateman.require_arguments("name", "author")')
+
+
+@microtest.test
+def test_successful_runs_return_results():
+    with utils.create_temp_dir(files=['script.py', 'broken.py']) as dir_path:
+        write_scripts(dir_path)
+        runner = templateman.Runner(working_dir=dir_path)
+        result = api.run('script.py', runner, name='project')
+        assert result.succeeded
+        assert os.path.isdir(os.path.join(dir_path, 'project'))
+
+
+@microtest.test
+def test_failed_runs_raise_typed_errors():
+    with utils.create_temp_dir(files=['script.py', 'broken.py']) as dir_path:
+        write_scripts(dir_path)
+        runner = templateman.Runner(working_dir=dir_path)
+
+        try:
+            api.run('missing.py', runner)
+        except errors.TemplateNotFoundError as err:
+            assert err.template == 'missing.py'
+        else:
+            assert False, 'TemplateNotFoundError was not raised'
+
+        try:
+            api.run('script.py', runner)
+        except errors.MissingArgumentError as err:
+            assert err.arguments == ('name',)
+        else:
+            assert False, 'MissingArgumentError was not raised'
+
+        try:
+            api.run('arguments.py', runner)
+        except errors.MissingArgumentError as err:
+            assert err.arguments == ('name', 'author')
+        else:
+            assert False, 'MissingArgumentError was not raised'
+
+        try:
+            api.run('reading.py', runner)
+        except errors.TemplateExecutionError as err:
+            assert isinstance(err.__cause__, FileNotFoundError)
+        else:
+            assert False, 'TemplateExecutionError was not raised'
+
+        try:
+            api.run('broken.py', runner)
+        except errors.TemplateExecutionError as err:
+            assert isinstance(err.__cause__, ValueError)
+            assert not err.result.succeeded
+        else:
+            assert False, 'TemplateExecutionError was not raised'
+
+        os.mkdir(os.path.join(dir_path, 'existing'))
+        try:
+            api.run('script.py', runner, name='existing')
+        except errors.OutputError as err:
+            assert isinstance(err.__cause__, FileExistsError)
+        else:
+            assert False, 'OutputError was not raised'
+
+
+if __name__ == '__main__':
+    microtest.run()
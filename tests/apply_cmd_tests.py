@@ -0,0 +1,75 @@
+import microtest
+import microtest.utils as utils
+
+import io
+import os
+import json
+import contextlib
+import templateman.cli as cli
+import templateman.planning as planning
+
+
+SCRIPT_TEXT = """
+import os
+import sys
+import templateman
+
+root = os.path.join(templateman.template_info['output_directory'], templateman.template_info['name'])
+templateman.create_directory(root)
+templateman.write_file(os.path.join(root, 'text.txt'), 'text')
+templateman.write_file(os.path.join(root, 'data.bin'), bytes(range(256)))
+returncode, output = templateman.run_command([sys.executable, '-c', 'print(1)'], path=root)
+assert returncode == 0
+"""
+
+
+@microtest.test
+def test_dry_runs_record_operations():
+    with utils.create_temp_dir(files=['script.py']) as dir_path:
+        with open(os.path.join(dir_path, 'script.py'), 'w') as file:
+            file.write(SCRIPT_TEXT)
+
+        with microtest.patch(cli.templateman, working_dir = dir_path):
+            with io.StringIO() as stream:
+                with contextlib.redirect_stdout(stream):
+                    cli.run_template(['script.py', '-n', 'project', '-o', dir_path, '--plan-output', 'plan.json'])
+                output = stream.getvalue()
+
+        assert not os.path.exists(os.path.join(dir_path, 'project'))
+        assert '1 directories, 2 files, 260 B written, 1 commands' in output
+        with open(os.path.join(dir_path, 'plan.json'), 'r') as file:
+            operations = json.load(file)['operations']
+        assert [op['operation'] for op in operations] == ['create_directory', 'write_file', 'write_file', 'run_command']
+
+
+@microtest.test
+def test_applying_plans():
+    with utils.create_temp_dir() as dir_path:
+        root = os.path.join(dir_path, 'project')
+        plan = planning.Plan()
+        plan.record_directory(root)
+        plan.record_file(os.path.join(root, 'text.txt'), 'text')
+        plan.record_file(os.path.join(root, 'data.bin'), b'\x00\xff')
+        plan.write(os.path.join(dir_path, 'plan.json'))
+
+        with microtest.patch(cli.templateman, working_dir = dir_path):
+            planning.apply_plan_file(['plan.json'])
+
+        with open(os.path.join(root, 'text.txt'), 'r') as file:
+            assert file.read() == 'text'
+        with open(os.path.join(root, 'data.bin'), 'rb') as file:
+            assert file.read() == b'\x00\xff'
+
+
+@microtest.test
+def test_applying_invalid_plans():
+    with utils.create_temp_dir(files=['plan.json']) as dir_path:
+        with microtest.patch(cli.templateman, working_dir = dir_path):
+            with io.StringIO() as stream:
+                with contextlib.redirect_stderr(stream):
+                    planning.apply_plan_file(['plan.json'])
+                assert "can't read plan" in stream.getvalue().lower()
+
+
+if __name__ == '__main__':
+    microtest.run()
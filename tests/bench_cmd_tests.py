@@ -0,0 +1,29 @@
+import microtest
+
+import templateman.benchmarks as benchmarks
+
+
+@microtest.test
+def test_results_are_summarized():
+    summary = benchmarks.summarize([3.0, 1.0, 2.0])
+    assert summary == { 'min': 1.0, 'median': 2.0, 'mean': 2.0, 'repeat': 3 }
+
+
+@microtest.test
+def test_regressions_are_detected():
+    baseline = {
+        'fast': { 'median': 1.0 },
+        'slow': { 'median': 1.0 },
+    }
+    results = {
+        'fast': { 'median': 1.05 },
+        'slow': { 'median': 1.5 },
+        'new': { 'median': 1.0 },
+    }
+    regressions = benchmarks.compare_results(results, baseline, threshold=10)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('slow')
+
+
+if __name__ == '__main__':
+    microtest.run()
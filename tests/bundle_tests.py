@@ -0,0 +1,90 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import templateman
+import templateman.bundles as bundles
+import templateman.cli as cli
+
+
+SCRIPT_TEXT = """
+import os
+import templateman
+
+root = os.path.join(templateman.template_info['output_directory'], templateman.template_info['name'])
+templateman.create_directory(root)
+templateman.write_file(os.path.join(root, 'README.md'), templateman.read_asset('assets/README.md'))
+templateman.copy_asset('assets/static', os.path.join(root, 'static'))
+"""
+
+
+def create_bundle(directory: str):
+    os.makedirs(os.path.join(directory, 'assets', 'static', 'css'))
+    with open(os.path.join(directory, bundles.ENTRY_POINT), 'w') as file:
+        file.write(SCRIPT_TEXT)
+    with open(os.path.join(directory, 'assets', 'README.md'), 'w') as file:
+        file.write('# project\n')
+    with open(os.path.join(directory, 'assets', 'static', 'css', 'style.css'), 'w') as file:
+        file.write('body {}\n')
+
+
+def check_output(output_dir: str):
+    with open(os.path.join(output_dir, 'project', 'README.md'), 'r') as file:
+        assert file.read() == '# project\n'
+    assert os.path.isfile(os.path.join(output_dir, 'project', 'static', 'css', 'style.css'))
+
+
+@microtest.test
+def test_running_directory_bundles():
+    with utils.create_temp_dir() as dir_path:
+        output_dir = os.path.join(dir_path, 'output')
+        os.mkdir(output_dir)
+        create_bundle(os.path.join(dir_path, 'bundle'))
+
+        with microtest.patch(cli.templateman, working_dir = dir_path):
+            cli.run_template(['bundle', '-n', 'project', '-o', output_dir])
+        check_output(output_dir)
+        assert templateman.template_bundle is None
+
+
+@microtest.test
+def test_installing_directories_as_bundles():
+    with utils.create_temp_dir() as dir_path:
+        template_dir = os.path.join(dir_path, 'templates')
+        output_dir = os.path.join(dir_path, 'output')
+        os.mkdir(template_dir)
+        os.mkdir(output_dir)
+        create_bundle(os.path.join(dir_path, 'bundle'))
+
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: template_dir }
+        with microtest.patch(cli.os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+            cli.install_template(['bundle'])
+            assert os.path.isfile(os.path.join(template_dir, 'bundle'))
+
+            os.rename(os.path.join(dir_path, 'bundle'), os.path.join(dir_path, 'moved'))
+            cli.run_template(['bundle', '-n', 'project', '-o', output_dir])
+        check_output(output_dir)
+
+
+@microtest.test
+def test_missing_assets():
+    with utils.create_temp_dir() as dir_path:
+        bundle_dir = os.path.join(dir_path, 'bundle')
+        archive_path = os.path.join(dir_path, 'bundle.zip')
+        create_bundle(bundle_dir)
+        bundles.pack_directory(bundle_dir, archive_path)
+
+        for path in (bundle_dir, archive_path):
+            bundle = bundles.open_bundle(path)
+            try:
+                assert bundle.read('assets/README.md') == b'# project\n'
+                bundle.read('assets/missing.txt')
+                assert False, 'Expected FileNotFoundError'
+            except FileNotFoundError:
+                pass
+            finally:
+                bundle.close()
+
+
+if __name__ == '__main__':
+    microtest.run()
@@ -0,0 +1,146 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import templateman
+import templateman.copying as copying
+
+
+@microtest.test
+def test_writing_files():
+    with utils.create_temp_dir() as dir_path:
+        path = os.path.join(dir_path, 'file.txt')
+        templateman.write_file(path, 'text\n')
+        templateman.write_file(path, b'bytes\n')
+        with open(path, 'rb') as file:
+            assert file.read() == b'bytes\n'
+
+
+@microtest.test
+def test_unchanged_files_are_not_written_in_incremental_mode():
+    with utils.create_temp_dir() as dir_path:
+        path = os.path.join(dir_path, 'file.txt')
+        with microtest.patch(templateman, incremental = True, file_stats = dict.fromkeys(templateman.file_stats, 0)):
+            templateman.create_directory(dir_path)
+            templateman.write_file(path, 'content')
+            os.utime(path, (0, 0))
+            
+            templateman.write_file(path, 'content')
+            assert os.stat(path).st_mtime == 0
+            
+            templateman.write_file(path, 'new content')
+            assert templateman.file_stats == { 'created': 1, 'updated': 1, 'unchanged': 1 }
+
+
+@microtest.test
+def test_staged_output_is_committed():
+    with utils.create_temp_dir() as dir_path:
+        root = os.path.join(dir_path, 'project')
+        templateman.begin_staging(dir_path)
+        try:
+            templateman.create_directory(root)
+            templateman.write_file(os.path.join(root, 'file.txt'), 'content')
+            assert not os.path.exists(root)
+            assert os.path.exists(os.path.join(templateman.resolve_path(root), 'file.txt'))
+            templateman.commit_staging()
+        finally:
+            templateman.discard_staging()
+        
+        assert os.listdir(dir_path) == ['project']
+        assert os.listdir(root) == ['file.txt']
+
+
+@microtest.test
+def test_staged_output_is_discarded():
+    with utils.create_temp_dir() as dir_path:
+        root = os.path.join(dir_path, 'project')
+        templateman.begin_staging(dir_path)
+        templateman.create_directory(root)
+        templateman.create_file(os.path.join(root, 'file.txt'))
+        templateman.discard_staging()
+        
+        assert os.listdir(dir_path) == []
+        assert templateman.resolve_path(root) == root
+
+
+@microtest.test
+def test_commands_are_rejected_in_staged_mode():
+    with utils.create_temp_dir() as dir_path:
+        templateman.begin_staging(dir_path)
+        try:
+            returncode, output = templateman.run_command(['git', 'init'], dir_path)
+            assert returncode != 0
+            assert 'staged mode' in output
+            results = templateman.run_commands_parallel([['git', 'init']], dir_path)
+            assert results[0][0] != 0
+        finally:
+            templateman.discard_staging()
+        
+        assert os.listdir(dir_path) == []
+
+
+@microtest.test
+def test_copy_strategies():
+    with utils.create_temp_dir() as dir_path:
+        src = os.path.join(dir_path, 'src')
+        os.makedirs(os.path.join(src, 'nested'))
+        for filename in ('a.txt', os.path.join('nested', 'b.txt')):
+            with open(os.path.join(src, filename), 'w') as file:
+                file.write(filename)
+        
+        for strategy in copying.STRATEGIES:
+            dst = os.path.join(dir_path, strategy)
+            templateman.copy_item(src, dst, strategy)
+            templateman.copy_item(os.path.join(src, 'a.txt'), os.path.join(dst, 'c.txt'), strategy)
+            with open(os.path.join(dst, 'nested', 'b.txt')) as file:
+                assert file.read() == os.path.join('nested', 'b.txt')
+            assert sorted(os.listdir(dst)) == ['a.txt', 'c.txt', 'nested']
+        
+        assert os.stat(os.path.join(src, 'a.txt')).st_nlink == 3
+
+
+@microtest.test
+def test_parallel_copy_keeps_symlinks():
+    with utils.create_temp_dir() as dir_path:
+        src = os.path.join(dir_path, 'src')
+        os.makedirs(os.path.join(src, 'nested'))
+        with open(os.path.join(src, 'a.txt'), 'w') as file:
+            file.write('a')
+        os.symlink('..', os.path.join(src, 'nested', 'cycle'))
+        os.symlink('a.txt', os.path.join(src, 'link.txt'))
+        
+        dst = os.path.join(dir_path, 'dst')
+        templateman.copy_item(src, dst, 'parallel')
+        assert os.readlink(os.path.join(dst, 'nested', 'cycle')) == '..'
+        assert os.readlink(os.path.join(dst, 'link.txt')) == 'a.txt'
+        assert sorted(os.listdir(dst)) == ['a.txt', 'link.txt', 'nested']
+
+
+@microtest.test
+def test_parallel_copy_uses_threads_for_many_small_files():
+    import concurrent.futures
+    executors = list()
+
+    class Executor(concurrent.futures.ThreadPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            executors.append(self)
+    
+    with utils.create_temp_dir() as dir_path:
+        src = os.path.join(dir_path, 'src')
+        os.makedirs(src)
+        for i in range(copying.PARALLEL_MIN_FILES):
+            with open(os.path.join(src, f'{i}.txt'), 'w') as file:
+                file.write(str(i))
+        
+        dst = os.path.join(dir_path, 'dst')
+        with microtest.patch(concurrent.futures, ThreadPoolExecutor = Executor):
+            templateman.copy_item(src, dst, 'parallel')
+        assert len(executors) == 1
+        assert len(os.listdir(dst)) == copying.PARALLEL_MIN_FILES
+        with open(os.path.join(dst, '7.txt')) as file:
+            assert file.read() == '7'
+
+
+if __name__ == '__main__':
+    microtest.run()
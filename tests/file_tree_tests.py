@@ -0,0 +1,98 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import zipfile
+import templateman
+import templateman.filetree as filetree
+import templateman.cli as cli
+
+
+TEMPLATE_FILES = {
+    os.path.join('{name}', 'README.md'): '# {name}\nAuthor: {author}\n',
+    os.path.join('{name}', 'src', '{name}.c'): 'int main() { return 0; }\n',
+}
+
+
+def write_template_files(directory: str):
+    for relpath, content in TEMPLATE_FILES.items():
+        path = os.path.join(directory, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            file.write(content)
+
+
+def check_rendered_output(output_dir: str):
+    with open(os.path.join(output_dir, 'project', 'README.md'), 'r') as file:
+        assert file.read() == '# project\nAuthor: me\n'
+    with open(os.path.join(output_dir, 'project', 'src', 'project.c'), 'r') as file:
+        assert file.read() == 'int main() { return 0; }\n'
+
+
+@microtest.test
+def test_rendering_text():
+    segments = filetree.compile_text('{name}: { {author} } {unknown}')
+    assert filetree.render_text(segments, { 'name': 'a', 'author': 'b' }) == 'a: { b } {unknown}'
+
+
+@microtest.test
+def test_running_directory_templates():
+    with utils.create_temp_dir() as dir_path:
+        template_dir = os.path.join(dir_path, 'template')
+        output_dir = os.path.join(dir_path, 'output')
+        os.mkdir(output_dir)
+        write_template_files(template_dir)
+
+        env_dict = { **os.environ, cli.TEMPLATE_DIRECTORY_ENV_VAR: dir_path }
+        with microtest.patch(os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+            cli.run_template(['template', '-n', 'project', '-a', 'me', '-o', output_dir])
+        check_rendered_output(output_dir)
+
+
+@microtest.test
+def test_running_archive_templates():
+    with utils.create_temp_dir() as dir_path:
+        template_dir = os.path.join(dir_path, 'template')
+        archive_path = os.path.join(dir_path, 'template.zip')
+        output_dir = os.path.join(dir_path, 'output')
+        os.mkdir(output_dir)
+        write_template_files(template_dir)
+        with zipfile.ZipFile(archive_path, 'w') as archive:
+            for relpath in TEMPLATE_FILES:
+                archive.write(os.path.join(template_dir, relpath), relpath)
+
+        env_dict = { **os.environ, cli.TEMPLATE_DIRECTORY_ENV_VAR: dir_path }
+        with microtest.patch(os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+            cli.run_template(['template.zip', '-n', 'project', '-a', 'me', '-o', output_dir])
+        check_rendered_output(output_dir)
+
+
+@microtest.test
+def test_render_plans_are_cached():
+    with utils.create_temp_dir() as dir_path:
+        template_dir = os.path.join(dir_path, 'template')
+        cache_path = os.path.join(dir_path, 'cache', 'plan')
+        write_template_files(template_dir)
+
+        plan = filetree.load_plan(template_dir, cache_path)
+        assert os.path.exists(cache_path)
+        filetree.compiled_plans.clear()
+        assert filetree.load_plan(template_dir, cache_path) == plan
+
+        with open(os.path.join(template_dir, 'new.txt'), 'w') as file:
+            file.write('{name}\n')
+        assert len(filetree.load_plan(template_dir, cache_path)) == len(plan) + 1
+
+
+@microtest.test
+def test_rendered_paths_must_stay_in_output_directory():
+    plan = ((filetree.TEXT_FILE, filetree.compile_text(os.path.join('..', '{name}')), ('',)),)
+    try:
+        filetree.render_plan(plan, { 'name': 'file' })
+        assert False, 'Expected ValueError'
+    except ValueError:
+        pass
+
+
+if __name__ == '__main__':
+    microtest.run()
@@ -0,0 +1,77 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import templateman
+import templateman.cli as cli
+
+
+SCRIPTS = {
+    'main.py': """
+import os
+import templateman
+
+templateman.include('part.py', name='first')
+templateman.include('part.py', name='second')
+templateman.write_file(os.path.join(templateman.template_info['output_directory'], 'main.txt'), templateman.template_info['name'])
+""",
+    'part.py': """
+import os
+import templateman
+
+templateman.include('leaf.py')
+templateman.write_file(os.path.join(templateman.template_info['output_directory'], templateman.template_info['name'] + '.txt'), templateman.template_info['author'])
+templateman.template_info['name'] = 'changed'
+""",
+    'leaf.py': """
+import templateman
+templateman.file_stats['leaf'] = templateman.file_stats.get('leaf', 0) + 1
+""",
+    'cycle_a.py': "import templateman\ntemplateman.include('cycle_b.py')\n",
+    'cycle_b.py': "import templateman\ntemplateman.include('cycle_a.py')\n",
+}
+
+
+def write_scripts(dir_path: str):
+    for name, text in SCRIPTS.items():
+        with open(os.path.join(dir_path, name), 'w') as file:
+            file.write(text)
+
+
+@microtest.test
+def test_included_templates_inherit_template_info():
+    with utils.create_temp_dir(files=list(SCRIPTS)) as dir_path:
+        write_scripts(dir_path)
+        env_dict = { **os.environ, cli.TEMPLATE_DIRECTORY_ENV_VAR: dir_path }
+        with microtest.patch(os, environ = env_dict):
+            runner = templateman.Runner(working_dir=dir_path)
+            result = runner.run('main.py', name='main', author='me')
+            assert result.succeeded, result.error
+            assert cli.resolve_cache_path(os.path.join(dir_path, 'part.py')) in cli.compiled_templates
+
+        for name, content in (('first', 'me'), ('second', 'me'), ('main', 'main')):
+            with open(os.path.join(dir_path, name + '.txt'), 'r') as file:
+                assert file.read() == content
+        assert result.file_stats['leaf'] == 2
+
+        path = lambda name: os.path.join(dir_path, name)
+        assert result.include_graph == {
+            path('main.py'): [path('part.py')],
+            path('part.py'): [path('leaf.py')],
+        }
+        assert templateman.include_stack == []
+
+
+@microtest.test
+def test_include_cycles_are_detected():
+    with utils.create_temp_dir(files=list(SCRIPTS)) as dir_path:
+        write_scripts(dir_path)
+        runner = templateman.Runner(working_dir=dir_path)
+        result = runner.run('cycle_a.py')
+        assert not result.succeeded
+        assert 'cycle' in result.error
+        assert result.error.endswith('cycle_a.py -> ' + os.path.join(dir_path, 'cycle_b.py') + ' -> ' + os.path.join(dir_path, 'cycle_a.py'))
+
+
+if __name__ == '__main__':
+    microtest.run()
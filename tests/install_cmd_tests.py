@@ -1,10 +1,12 @@
 import io
 import os
+import json
 import contextlib
 import tempfile
 import microtest
 import microtest.utils as utils
 import templateman.cli as cli
+import templateman.store as store
 
 
 @microtest.test
@@ -82,6 +84,113 @@ def test_install_non_existing_file():
                     assert 'path does not exist' in output.lower()
 
 
+@microtest.test
+def test_identical_templates_are_stored_once():
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        for name in ('first.py', 'second.py'):
+            with open(os.path.join(dir_path, name), 'w') as file:
+                file.write("print('hello')\n")
+
+        with microtest.patch(os, environ = env_dict):
+            cli.install_template([os.path.join(dir_path, 'first.py')])
+            cli.install_template([os.path.join(dir_path, 'second.py')])
+        
+        first = os.path.join(templates_path, 'first')
+        second = os.path.join(templates_path, 'second')
+        store_dir = os.path.join(templates_path, store.STORE_DIRECTORY_NAME)
+        assert len(os.listdir(store_dir)) == 1
+        assert os.path.islink(first) and os.path.islink(second)
+        assert os.path.samefile(first, second)
+        with open(second, 'r') as file:
+            assert file.read() == "print('hello')\n"
+
+        index, _ = cli.load_template_index(templates_path)
+        assert index['first']['hash'] == index['second']['hash'] == store.linked_blob(first)
+
+
+@microtest.test
+def test_installing_many_templates():
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        for i in range(10):
+            with open(os.path.join(dir_path, f'script_{i}.py'), 'w') as file:
+                file.write(f"print({i})\n")
+
+        with open(os.devnull, 'w') as DEVNULL:
+            with contextlib.redirect_stdout(DEVNULL):
+                with microtest.patch(os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+                    cli.install_template(['script_1.py', 'script_[2-4].py', '--jobs', '2'])
+        assert sorted(cli.load_template_index(templates_path)[0]) == ['script_1', 'script_2', 'script_3', 'script_4']
+
+
+@microtest.test
+def test_installing_identical_templates_concurrently():
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        for i in range(100):
+            with open(os.path.join(dir_path, f'script_{i}.py'), 'w') as file:
+                file.write("print('same')\n")
+
+        with open(os.devnull, 'w') as DEVNULL:
+            with contextlib.redirect_stdout(DEVNULL):
+                with microtest.patch(os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+                    cli.install_template(['script_*.py', '--jobs', '16'])
+        assert len(cli.load_template_index(templates_path)[0]) == 100
+        blobs = os.listdir(os.path.join(templates_path, store.STORE_DIRECTORY_NAME))
+        assert len(blobs) == 1
+
+
+@microtest.test
+def test_syncing_template_directory():
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        sync_path = os.path.join(dir_path, 'catalog')
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        os.mkdir(sync_path)
+        for i in range(3):
+            with open(os.path.join(sync_path, f'script_{i}.py'), 'w') as file:
+                file.write(f"print({i})\n")
+
+        with io.StringIO() as stream:
+            with contextlib.redirect_stdout(stream):
+                with microtest.patch(os, environ = env_dict):
+                    cli.install_template(['--sync', sync_path])
+                    with open(os.path.join(sync_path, 'script_0.py'), 'w') as file:
+                        file.write("print('changed')\n")
+                    cli.install_template(['--sync', sync_path])
+            
+            lines = stream.getvalue().splitlines()
+            assert 'Installed 3 templates, 0 unchanged' in lines[0]
+            assert 'Installed 1 templates, 2 unchanged' in lines[1]
+
+
+@microtest.test
+def test_install_records_as_ndjson():
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        for i in range(2):
+            with open(os.path.join(dir_path, f'script_{i}.py'), 'w') as file:
+                file.write(f"print({i})\n")
+
+        with io.StringIO() as stream:
+            with contextlib.redirect_stdout(stream):
+                with microtest.patch(os, environ = env_dict), microtest.patch(cli.templateman, working_dir = dir_path):
+                    cli.install_template(['script_0.py', '--format', 'ndjson'])
+                    cli.install_template(['script_0.py', 'script_1.py', '--format', 'ndjson'])
+            records = [json.loads(line) for line in stream.getvalue().splitlines()]
+
+        assert [(record['name'], record['status']) for record in records] == [
+            ('script_0', 'installed'), ('script_0', 'unchanged'), ('script_1', 'installed'),
+        ]
+        assert records[0]['hash'] == records[1]['hash']
+        assert records[2]['size'] == len("print(1)\n")
+
+
 @microtest.test
 def test_error_handling_when_user_home_directory_cant_be_resolved():
     def raise_exception(*args):
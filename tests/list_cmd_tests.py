@@ -3,6 +3,7 @@ import microtest.utils as utils
 
 import os
 import io
+import json
 import contextlib
 import templateman.cli as cli
 
@@ -21,5 +22,61 @@ def test_template_listing():
             assert 'template_2' in output
 
 
+@microtest.test
+def test_template_listing_as_json():
+    with io.StringIO() as stream:
+        with utils.create_temp_dir(files=['template_1']) as dir_path:
+            env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: dir_path }
+            with microtest.patch(cli.os, environ=env_dict):
+                with contextlib.redirect_stdout(stream):
+                    cli.list_installed_templates(['--format', 'json'])
+            records = json.loads(stream.getvalue())
+            assert [record['name'] for record in records] == ['template_1']
+            assert records[0]['path'] == os.path.join(dir_path, 'template_1')
+            assert records[0]['size'] == 0
+
+
+@microtest.test
+def test_template_index_is_updated():
+    with utils.create_temp_dir(files=['template_1']) as dir_path:
+        with open(os.path.join(dir_path, 'template_1'), 'w') as file:
+            file.write('"""Summary line.\n\nMore text."""\n')
+        
+        index, error = cli.load_template_index(dir_path)
+        assert error is None
+        assert list(index) == ['template_1']
+        assert index['template_1']['summary'] == 'Summary line.'
+        
+        previous_mtime = cli.directory_mtime(dir_path)
+        open(os.path.join(dir_path, 'template_2'), 'w').close()
+        cli.update_template_index(dir_path, 'template_2', previous_mtime)
+        
+        _, templates = cli.read_template_index(dir_path)
+        assert list(templates) == ['template_1', 'template_2']
+        
+        index, error = cli.load_template_index(dir_path)
+        assert list(index) == ['template_1', 'template_2']
+
+
+@microtest.test
+def test_template_index_detects_modified_templates():
+    with utils.create_temp_dir(files=['template_1']) as dir_path:
+        path = os.path.join(dir_path, 'template_1')
+        with open(path, 'w') as file:
+            file.write('"""Old summary."""\n')
+        
+        index, _ = cli.load_template_index(dir_path)
+        old_hash = index['template_1']['hash']
+        
+        with open(path, 'w') as file:
+            file.write('"""New summary."""\nprint()\n')
+        
+        index, _ = cli.load_template_index(dir_path)
+        assert index['template_1']['summary'] == 'New summary.'
+        assert index['template_1']['hash'] != old_hash
+        _, templates = cli.read_template_index(dir_path)
+        assert templates['template_1']['summary'] == 'New summary.'
+
+
 if __name__ == '__main__':
     microtest.run()
@@ -4,6 +4,7 @@ import microtest.utils as utils
 import os
 import contextlib
 import templateman.cli as cli
+import templateman.store as store
 
 
 @microtest.test
@@ -25,5 +26,33 @@ def test_removing_templates():
             assert not os.path.exists(TEMPLATE_PATH)
 
 
+@microtest.test
+def test_unreferenced_content_is_removed():
+    with open(os.devnull, 'w') as DEVNULL:
+        with utils.create_temp_dir(files=['script.py', 'other.py']) as dir_path:
+            with open(os.path.join(dir_path, 'other.py'), 'w') as file:
+                file.write("print('other')\n")
+            env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: os.path.join(dir_path, 'templates') }
+            with microtest.patch(cli.os, environ=env_dict):
+                with contextlib.redirect_stdout(DEVNULL):
+                    cli.install_template([os.path.join(dir_path, 'script.py'), os.path.join(dir_path, 'other.py')])
+                    store_dir = os.path.join(dir_path, 'templates', store.STORE_DIRECTORY_NAME)
+                    assert len(os.listdir(store_dir)) == 2
+
+                    os.remove(os.path.join(dir_path, 'templates', 'other'))
+                    with open(os.path.join(dir_path, 'templates', 'other'), 'w') as file:
+                        file.write("print('edited')\n")
+                    cli.remove_installed_template(['script', '-y'])
+                    assert os.listdir(store_dir) == []
+
+
+@microtest.test
+def test_removing_many_templates_without_confirmation():
+    with utils.create_temp_dir(files=['first', 'second', 'third']) as dir_path:
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: dir_path }
+        with microtest.patch(cli.os, environ=env_dict):
+            cli.remove_installed_template(['first', 'second', '-y'])
+        assert os.listdir(dir_path) == ['third']
+
 if __name__ == '__main__':
     microtest.run()
@@ -0,0 +1,89 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import pathlib
+import templateman
+import templateman.engine as engine
+
+
+@microtest.test
+def test_rendering_expressions():
+    text = templateman.render('{{ name }}: {{ value * 2 }}', name='x', value=21)
+    assert text == 'x: 42'
+
+
+@microtest.test
+def test_rendering_blocks():
+    template = (
+        '{% for item in items %}\n'
+        '{% if item > 1 %}\n'
+        '{{ item }} > 1\n'
+        '{% else %}\n'
+        '{{ item }} <= 1\n'
+        '{% endif %}\n'
+        '{% endfor %}\n'
+        )
+    assert templateman.render(template, items=[1, 2]) == '1 <= 1\n2 > 1\n'
+
+
+@microtest.test
+def test_undefined_variables():
+    assert templateman.render('{% if missing %}yes{% else %}no{% endif %}') == 'no'
+    try:
+        templateman.render('{{ missing }}')
+        assert False, 'Expected NameError'
+    except NameError:
+        pass
+
+
+@microtest.test
+def test_invalid_templates():
+    for template in ('{% if x %}', '{% endfor %}', '{{ 1 + }}', '{% while x %}'):
+        try:
+            engine.compile_template(template)
+            assert False, 'Expected SyntaxError'
+        except SyntaxError:
+            pass
+
+
+@microtest.test
+def test_compiled_templates_are_cached():
+    with microtest.patch(engine, CACHE_SIZE = 2, compiled_templates = engine.collections.OrderedDict()):
+        render = engine.compile_template('{{ 1 }}')
+        engine.compile_template('{{ 2 }}')
+        assert engine.compile_template('{{ 1 }}') is render
+
+        engine.compile_template('{{ 3 }}')
+        assert len(engine.compiled_templates) == 2
+        assert engine.compile_template('{{ 1 }}') is render
+
+
+@microtest.test
+def test_rendering_into_files():
+    with utils.create_temp_dir() as dir_path:
+        template_path = pathlib.Path(dir_path, 'template.txt')
+        template_path.write_text('{% for i in range(3) %}{{ i }}{% endfor %}\n')
+
+        path = os.path.join(dir_path, 'file.txt')
+        templateman.render_to_file(path, template_path)
+        with open(path, 'r') as file:
+            assert file.read() == '012\n'
+
+
+@microtest.test
+def test_failed_renders_leave_files_untouched():
+    with utils.create_temp_dir() as dir_path:
+        path = os.path.join(dir_path, 'file.txt')
+        with open(path, 'w') as file:
+            file.write('old content')
+
+        for template in ('{% for i in range(3) %}{{ i }}{{ 1 // (i - 1) }}{% endfor %}', '{{ 1 + "a" }}'):
+            templateman.render_to_file(path, template)
+            with open(path, 'r') as file:
+                assert file.read() == 'old content'
+        assert os.listdir(dir_path) == ['file.txt']
+
+
+if __name__ == '__main__':
+    microtest.run()
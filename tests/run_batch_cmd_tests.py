@@ -0,0 +1,97 @@
+import microtest
+import microtest.utils as utils
+
+import io
+import os
+import json
+import contextlib
+
+import templateman
+import templateman.cli as cli
+
+
+SCRIPT_TEXT = '\n'.join([
+    'import templateman',
+    'templateman.require_arguments(\'name\')',
+    "print(f\"name = {templateman.template_info.get('name')}\")",
+])
+
+
+@microtest.test
+def test_running_templates_for_each_row():
+    SCRIPT_NAME = 'script.py'
+    MANIFEST_NAME = 'manifest.json'
+    with utils.create_temp_dir(files=[SCRIPT_NAME, MANIFEST_NAME]) as script_dir:
+        SCRIPT_PATH = os.path.join(script_dir, SCRIPT_NAME)
+        MANIFEST_PATH = os.path.join(script_dir, MANIFEST_NAME)
+        with open(SCRIPT_PATH, 'w') as script_file:
+            script_file.write(SCRIPT_TEXT)
+        with open(MANIFEST_PATH, 'w') as manifest_file:
+            json.dump([{'name': 'first'}, {'name': 'second'}], manifest_file)
+        
+        with io.StringIO() as stream:
+            with contextlib.redirect_stdout(stream):
+                cli.run_template_batch([SCRIPT_PATH, MANIFEST_PATH])
+        
+            output = stream.getvalue()
+            assert 'name = first' in output
+            assert 'name = second' in output
+            assert '2 succeeded, 0 failed' in output
+        
+        assert templateman.template_info['name'] == 'UNKNOWN'
+
+
+@microtest.test
+def test_aborted_rows_are_reported():
+    SCRIPT_NAME = 'script.py'
+    MANIFEST_NAME = 'manifest.csv'
+    with utils.create_temp_dir(files=[SCRIPT_NAME, MANIFEST_NAME]) as script_dir:
+        SCRIPT_PATH = os.path.join(script_dir, SCRIPT_NAME)
+        MANIFEST_PATH = os.path.join(script_dir, MANIFEST_NAME)
+        with open(SCRIPT_PATH, 'w') as script_file:
+            script_file.write(SCRIPT_TEXT)
+        with open(MANIFEST_PATH, 'w') as manifest_file:
+            manifest_file.write('name,author\n,someone\nlast,someone\n')
+        
+        with io.StringIO() as stream:
+            with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+                cli.run_template_batch([SCRIPT_PATH, MANIFEST_PATH])
+        
+            output = stream.getvalue()
+            assert 'name = last' in output
+            assert '1 succeeded, 1 failed' in output
+
+
+@microtest.test
+def test_running_rows_in_parallel():
+    SCRIPT_NAME = 'script.py'
+    MANIFEST_NAME = 'manifest.ndjson'
+    with utils.create_temp_dir(files=[SCRIPT_NAME, MANIFEST_NAME]) as script_dir:
+        SCRIPT_PATH = os.path.join(script_dir, SCRIPT_NAME)
+        MANIFEST_PATH = os.path.join(script_dir, MANIFEST_NAME)
+        with open(SCRIPT_PATH, 'w') as script_file:
+            script_file.write(SCRIPT_TEXT)
+        with open(MANIFEST_PATH, 'w') as manifest_file:
+            for name in ('first', None, 'third'):
+                manifest_file.write(json.dumps({'name': name} if name else {}) + '\n')
+        
+        with io.StringIO() as stream:
+            with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+                cli.run_template_batch([SCRIPT_PATH, MANIFEST_PATH, '--jobs', '2'])
+        
+            lines = stream.getvalue().splitlines()
+            assert any(line.startswith('[ OK ] 1/3 first') for line in lines)
+            assert any(line.startswith('[ FAILED ] 2/3') for line in lines)
+            assert any(line.startswith('[ OK ] 3/3 third') for line in lines)
+            assert any('2 succeeded, 1 failed' in line for line in lines)
+
+
+@microtest.test
+def test_unsupported_manifest_format():
+    rows, error = cli.load_manifest('manifest.xml')
+    assert rows == []
+    assert 'unsupported manifest format' in error.lower()
+
+
+if __name__ == '__main__':
+    microtest.run()
@@ -3,6 +3,7 @@ import microtest.utils as utils
 
 import io
 import os
+import json
 import contextlib
 
 import templateman.cli as cli
@@ -62,6 +63,126 @@ def test_argument_passing():
             assert 'name = NAME' in output
 
 
+@microtest.test
+def test_compiled_scripts_are_cached():
+    SCRIPT_NAME = 'script'
+    with utils.create_temp_dir(files=[SCRIPT_NAME]) as template_dir:
+        env_dict = { cli.TEMPLATE_DIRECTORY_ENV_VAR: template_dir }
+        
+        with open(os.path.join(template_dir, SCRIPT_NAME), 'w') as script_file:
+            script_file.write("print('module executed')\n")
+        
+        with microtest.patch(cli.os, environ = env_dict):
+            with io.StringIO() as stream:
+                with contextlib.redirect_stdout(stream):
+                    cli.run_template([SCRIPT_NAME])
+                    cache_path = cli.resolve_cache_path(os.path.join(template_dir, SCRIPT_NAME))
+                    assert os.path.exists(cache_path)
+
+                    os.remove(cache_path)
+                    cli.run_template([SCRIPT_NAME, '--no-cache'])
+                    assert not os.path.exists(cache_path)
+            
+                output = stream.getvalue()
+                assert output.count('module executed') == 2
+
+
+@microtest.test
+def test_profiling_scripts():
+    SCRIPT_NAME = 'script.py'
+    with utils.create_temp_dir(files=[SCRIPT_NAME]) as script_dir:
+        SCRIPT_PATH = os.path.join(script_dir, SCRIPT_NAME)
+        TRACE_PATH = os.path.join(script_dir, 'trace.json')
+        with open(SCRIPT_PATH, 'w') as script_file:
+            script_file.write("import os\nimport templateman\n")
+            script_file.write("templateman.write_file(os.path.join(templateman.template_info['output_directory'], 'file.txt'), 'content')\n")
+        
+        with microtest.patch(cli.templateman, working_dir = script_dir, template_info = { 'output_directory': script_dir }):
+            with io.StringIO() as stream:
+                with contextlib.redirect_stdout(stream):
+                    cli.run_template([SCRIPT_PATH, '--trace-output', 'trace.json'])
+                output = stream.getvalue()
+        
+        assert cli.templateman.profiler is None
+        assert 'execute' in output
+        assert 'write_file' in output
+        with open(TRACE_PATH, 'r') as trace_file:
+            events = json.load(trace_file)['traceEvents']
+        names = { event['name'] for event in events }
+        assert { 'resolve', 'open', 'compile', 'execute', 'write_file' }.issubset(names)
+        assert os.path.exists(os.path.join(script_dir, 'file.txt'))
+
+
+@microtest.test
+def test_run_records_as_json():
+    SCRIPT_NAME = 'script.py'
+    with utils.create_temp_dir(files=[SCRIPT_NAME]) as script_dir:
+        SCRIPT_PATH = os.path.join(script_dir, SCRIPT_NAME)
+        with open(SCRIPT_PATH, 'w') as script_file:
+            script_file.write("import os\nimport templateman\n")
+            script_file.write("print('script output')\n")
+            script_file.write("templateman.write_file(os.path.join(templateman.template_info['output_directory'], 'file.txt'), 'content')\n")
+        
+        with microtest.patch(cli.templateman, working_dir = script_dir, template_info = dict()):
+            with io.StringIO() as stream, io.StringIO() as error_stream:
+                with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(error_stream):
+                    cli.run_template([SCRIPT_NAME, '-o', script_dir, '--format', 'json'])
+                records = json.loads(stream.getvalue())
+                assert 'script output' in error_stream.getvalue()
+        
+        assert records[0]['path'] == SCRIPT_PATH
+        assert records[0]['status'] == 'succeeded'
+        assert records[0]['files']['created'] == 1
+        assert records[0]['errors'] == []
+
+
+@microtest.test
+def test_running_the_staged_example():
+    SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_scripts', 'c_header.py')
+    with utils.create_temp_dir() as dir_path:
+        templates_path = os.path.join(dir_path, 'templates')
+        env_dict = { **os.environ, cli.TEMPLATE_DIRECTORY_ENV_VAR: templates_path }
+        with open(os.devnull, 'w') as DEVNULL, contextlib.redirect_stdout(DEVNULL):
+            with microtest.patch(os, environ = env_dict):
+                cli.install_template([SCRIPT_PATH])
+                with microtest.patch(cli.templateman, working_dir = dir_path, template_info = { 'output_directory': dir_path }):
+                    cli.run_template(['c_header', '-n', 'example', '--staged'])
+
+        assert sorted(os.listdir(dir_path)) == ['example.h', 'templates']
+        with open(os.path.join(dir_path, 'example.h'), 'r') as file:
+            assert file.read().startswith('#ifndef EXAMPLE_H')
+
+
+@microtest.test
+def test_running_copying_scripts_incrementally():
+    with utils.create_temp_dir(files=['script.py']) as dir_path:
+        assets_path = os.path.join(dir_path, 'assets')
+        output_path = os.path.join(dir_path, 'output')
+        os.makedirs(os.path.join(assets_path, 'icons'))
+        for name, content in (('a.txt', 'a'), (os.path.join('icons', 'b.png'), 'b')):
+            with open(os.path.join(assets_path, name), 'w') as file:
+                file.write(content)
+        with open(os.path.join(dir_path, 'script.py'), 'w') as script_file:
+            script_file.write("import os\nimport templateman\n")
+            script_file.write(f"templateman.copy_item({assets_path!r}, os.path.join({output_path!r}, 'assets'))\n")
+            script_file.write(f"templateman.copy_item(os.path.join({assets_path!r}, 'a.txt'), {output_path!r})\n")
+        os.mkdir(output_path)
+
+        stats = list()
+        for _ in range(2):
+            with microtest.patch(cli.templateman, working_dir = dir_path, template_info = { 'output_directory': output_path }):
+                with open(os.devnull, 'w') as DEVNULL, contextlib.redirect_stdout(DEVNULL):
+                    cli.run_template(['script.py', '--incremental'])
+                stats.append(dict(cli.templateman.file_stats))
+            with open(os.path.join(assets_path, 'a.txt'), 'w') as file:
+                file.write('changed')
+
+        assert stats[0] == { 'created': 3, 'updated': 0, 'unchanged': 0 }
+        assert stats[1] == { 'created': 0, 'updated': 2, 'unchanged': 1 }
+        with open(os.path.join(output_path, 'assets', 'a.txt'), 'r') as file:
+            assert file.read() == 'changed'
+
+
 @microtest.test
 def test_running_non_existent_scripts():
     SCRIPT_NAME = 'script.py'
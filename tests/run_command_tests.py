@@ -0,0 +1,43 @@
+import microtest
+
+import sys
+import asyncio
+import templateman
+
+
+@microtest.test
+def test_streamed_output_is_passed_to_callback():
+    lines = list()
+    cmd = [sys.executable, '-c', 'for i in range(5): print(i)']
+    returncode, output = templateman.run_command_streaming(cmd, callback=lines.append, max_lines=2)
+    assert returncode == 0
+    assert [line.strip() for line in lines] == ['0', '1', '2', '3', '4']
+    assert output.split() == ['3', '4']
+
+
+@microtest.test
+def test_async_command_output_is_returned():
+    cmd = [sys.executable, '-c', 'print("output")']
+    returncode, output = asyncio.run(templateman.run_command_async(cmd))
+    assert returncode == 0
+    assert 'output' in output
+
+
+@microtest.test
+def test_parallel_commands_are_returned_in_order():
+    cmds = [[sys.executable, '-c', f'print({i})'] for i in range(4)]
+    results = templateman.run_commands_parallel(cmds, max_concurrency=2)
+    assert [output.strip() for _, output in results] == ['0', '1', '2', '3']
+    assert all(returncode == 0 for returncode, _ in results)
+
+
+@microtest.test
+def test_timed_out_commands_are_killed():
+    cmd = [sys.executable, '-c', 'import time; time.sleep(10)']
+    results = templateman.run_commands_parallel([cmd], timeout=0.5)
+    returncode, _ = results[0]
+    assert returncode != 0
+
+
+if __name__ == '__main__':
+    microtest.run()
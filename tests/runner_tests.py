@@ -0,0 +1,66 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import templateman
+
+
+SCRIPT_TEXT = """
+import os
+import templateman
+
+templateman.require_arguments('name')
+path = os.path.join(templateman.template_info['output_directory'], templateman.template_info['name'] + '.txt')
+templateman.write_file(path, templateman.template_info['author'])
+"""
+
+
+@microtest.test
+def test_templates_are_run_with_their_own_info():
+    with utils.create_temp_dir(files=['script.py']) as dir_path:
+        with open(os.path.join(dir_path, 'script.py'), 'w') as file:
+            file.write(SCRIPT_TEXT)
+
+        info = dict(templateman.template_info)
+        runner = templateman.Runner(working_dir=dir_path)
+        for i in range(200):
+            result = runner.run('script.py', name=f'file{i}', author=f'author{i}')
+            assert result.succeeded, result.error
+            assert result.file_stats['created'] == 1
+
+        assert len(os.listdir(dir_path)) == 201
+        with open(os.path.join(dir_path, 'file7.txt'), 'r') as file:
+            assert file.read() == 'author7'
+        assert templateman.template_info == info
+        assert templateman.context is None
+        assert templateman.running is False
+
+
+@microtest.test
+def test_failures_are_returned_in_results():
+    with utils.create_temp_dir(files=['script.py', 'broken.py']) as dir_path:
+        with open(os.path.join(dir_path, 'script.py'), 'w') as file:
+            file.write(SCRIPT_TEXT)
+        with open(os.path.join(dir_path, 'broken.py'), 'w') as file:
+            file.write('raise ValueError("broken")')
+
+        runner = templateman.Runner(working_dir=dir_path)
+        result = runner.run('script.py')
+        assert not result.succeeded
+        assert "Missing required argument 'name'" in result.error
+
+        result = runner.run('broken.py')
+        assert not result.succeeded
+        assert 'ValueError: broken' in result.error
+
+        result = runner.run('missing.py')
+        assert not result.succeeded
+        assert result.errors
+
+        result = runner.run('script.py', name='after')
+        assert result.succeeded
+        assert os.path.isfile(os.path.join(dir_path, 'after.txt'))
+
+
+if __name__ == '__main__':
+    microtest.run()
@@ -0,0 +1,102 @@
+import microtest
+import microtest.utils as utils
+
+import io
+import os
+import sys
+import time
+import contextlib
+import subprocess
+import templateman.client as client
+import templateman.server as server
+
+
+@microtest.test
+def test_commands_are_not_forwarded_without_server():
+    with utils.create_temp_dir() as dir_path:
+        env_dict = { client.SOCKET_ENV_VAR: os.path.join(dir_path, 'server.sock') }
+        with microtest.patch(client.os, environ = env_dict):
+            assert client.forward_to_server('run', ['script']) is None
+
+
+@microtest.test
+def test_stale_socket_is_not_used():
+    with utils.create_temp_dir(files=['server.sock']) as dir_path:
+        socket_path = os.path.join(dir_path, 'server.sock')
+        env_dict = { client.SOCKET_ENV_VAR: socket_path }
+        with microtest.patch(client.os, environ = env_dict):
+            assert not server.is_server_running(socket_path)
+            assert client.forward_to_server('run', ['script']) is None
+
+
+@microtest.test
+def test_sockets_of_other_users_are_not_used():
+    with utils.create_temp_dir(files=['server.sock']) as dir_path:
+        socket_path = os.path.join(dir_path, 'server.sock')
+        assert not client.is_trusted_socket(socket_path)
+
+        env_dict = { client.SOCKET_ENV_VAR: socket_path }
+        with io.StringIO() as stream:
+            with microtest.patch(client.os, environ = env_dict), contextlib.redirect_stderr(stream):
+                assert client.forward_to_server('run', ['script']) is None
+            assert 'not owned by the current user' in stream.getvalue()
+
+
+@microtest.test
+def test_default_socket_is_in_a_private_directory():
+    with utils.create_temp_dir() as dir_path:
+        with microtest.patch(client.os, environ = { 'TMPDIR': dir_path }):
+            socket_path = client.resolve_socket_path()
+        assert os.path.dirname(os.path.dirname(socket_path)) == dir_path
+        with microtest.patch(client.os, environ = { 'XDG_RUNTIME_DIR': dir_path }):
+            assert client.resolve_socket_path() == os.path.join(dir_path, 'templateman.sock')
+
+
+@microtest.test
+def test_watching_is_not_forwarded():
+    assert client.should_forward('run', ['script', '--name', 'example'])
+    assert not client.should_forward('run', ['script', '--watch'])
+    assert not client.should_forward('install', ['script'])
+
+
+@microtest.test
+def test_running_templates_through_server():
+    with utils.create_temp_dir() as dir_path:
+        socket_dir = os.path.join(dir_path, 'run')
+        os.makedirs(socket_dir, mode=0o700)
+        template_dir = os.path.join(dir_path, 'templates')
+        os.makedirs(template_dir)
+        with open(os.path.join(dir_path, 'hello.py'), 'w') as file:
+            file.write('import os\nprint(f"hello from {os.getppid()}")\n')
+        with open(os.path.join(dir_path, 'failing.py'), 'w') as file:
+            file.write('import sys\nprint("failing", file=sys.stderr)\nsys.exit(3)\n')
+
+        env = dict(os.environ)
+        env[client.SOCKET_ENV_VAR] = os.path.join(socket_dir, 'server.sock')
+        env['PY_TEMPLATES_DIR'] = template_dir
+        cmd = [sys.executable, '-m', 'templateman', 'serve']
+        server_proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 10
+            while not server.is_server_running(env[client.SOCKET_ENV_VAR]):
+                assert server_proc.poll() is None and time.monotonic() < deadline
+                time.sleep(0.05)
+
+            cmd = [sys.executable, '-m', 'templateman', 'run', 'hello.py']
+            proc = subprocess.run(cmd, env=env, cwd=dir_path, capture_output=True, text=True)
+            assert proc.returncode == 0
+            assert proc.stdout.startswith('hello from ')
+            assert proc.stdout.split()[-1] == str(server_proc.pid)
+
+            cmd = [sys.executable, '-m', 'templateman', 'run', 'failing.py']
+            proc = subprocess.run(cmd, env=env, cwd=dir_path, capture_output=True, text=True)
+            assert proc.returncode == 3
+            assert 'failing' in proc.stderr
+
+        finally:
+            server_proc.terminate()
+            server_proc.wait(10)
+
+
+if __name__ == '__main__':
+    microtest.run()
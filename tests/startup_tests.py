@@ -0,0 +1,95 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import sys
+import subprocess
+
+
+IMPORT_TIME_BUDGET_US = 200_000
+
+HEAVY_MODULES = (
+    'asyncio',
+    'hashlib',
+    'shutil',
+    'socket',
+    'tempfile',
+    'zipfile',
+    'subprocess',
+    'concurrent.futures',
+    'templateman.server',
+)
+
+LAZY_MODULES = (
+    'ast',
+    'csv',
+    'glob',
+    'cProfile',
+)
+
+LIST_COMMAND_SCRIPT = """
+import sys
+import templateman.__main__ as main
+main.main(['list'])
+print(' '.join(sys.modules), file=sys.stderr)
+"""
+
+
+def imported_modules(script: str) -> list:
+    """
+    Run the script in a new interpreter and return the names of the
+    modules it printed into stderr.
+    """
+    with utils.create_temp_dir() as template_dir:
+        env = dict(os.environ)
+        env['PY_TEMPLATES_DIR'] = template_dir
+        cmd = [sys.executable, '-c', script]
+        proc = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    return proc.stderr.split()
+
+
+def measure_import_time(args) -> int:
+    """
+    Run the cli with -X importtime and return the cumulative import time
+    of the top level templateman modules in microseconds.
+    """
+    with utils.create_temp_dir() as template_dir:
+        env = dict(os.environ)
+        env['PY_TEMPLATES_DIR'] = template_dir
+        cmd = [sys.executable, '-X', 'importtime', '-m', 'templateman', *args]
+        proc = subprocess.run(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, module = line.split('|')
+        if module[1:].startswith('templateman'):
+            total += int(cumulative)
+    return total
+
+
+@microtest.test
+def test_list_command_import_time():
+    best = min(measure_import_time(['list']) for _ in range(3))
+    assert best < IMPORT_TIME_BUDGET_US
+
+
+@microtest.test
+def test_heavy_modules_are_not_imported_on_startup():
+    modules = imported_modules('import sys, templateman.__main__; print(" ".join(sys.modules), file=sys.stderr)')
+    assert 'templateman.cli' in modules
+    for module in HEAVY_MODULES + LAZY_MODULES:
+        assert module not in modules
+
+
+@microtest.test
+def test_heavy_modules_are_not_imported_by_list_command():
+    modules = imported_modules(LIST_COMMAND_SCRIPT)
+    assert 'templateman.cli' in modules
+    for module in HEAVY_MODULES:
+        assert module not in modules
+
+
+if __name__ == '__main__':
+    microtest.run()
@@ -18,5 +18,4 @@ lines = '\n'.join([
     ''
 ])
 
-with open(filepath, 'w') as file:
-    file.write(lines)
+templateman.write_file(filepath, lines)
@@ -22,7 +22,6 @@ Author: Valtteri Rajalainen
 """
 
 import os
-import sys
 import templateman
 
 # Abort if name or author are missing from template_info
@@ -48,31 +47,25 @@ gitignore_text = """# __pycache__
 *env
 
 """
-with open(os.path.join(root_path, '.gitignore'), 'w') as gitignore:
-    gitignore.write(gitignore_text)
+templateman.write_file(os.path.join(root_path, '.gitignore'), gitignore_text)
 
 
-py_setup_text = f"""from setuptools import find_packages, setup
+py_setup_template = """from setuptools import find_packages, setup
 
 
 setup(
-    name='{name}',
+    name='{{ name }}',
     version='0.0.1a',
-    author='{templateman.template_info['author']}',
+    author='{{ author }}',
     python_requires='>=3.7',
     packages=find_packages(),
 )
 
 """
-with open(os.path.join(root_path, 'setup.py'), 'w') as py_setup:
-    py_setup.write(py_setup_text)
+templateman.render_to_file(os.path.join(root_path, 'setup.py'), py_setup_template)
 
 
-create_venv_command = [sys.executable, '-m', 'venv', 'venv']
-templateman.run_command(create_venv_command, path=root_path)
-
-_, py_interpreter_file = os.path.split(sys.executable)
-py_venv_interpreter_path = os.path.abspath(os.path.join(root_path, 'venv/bin/' + py_interpreter_file))
+py_venv_interpreter_path = templateman.create_venv(os.path.join(root_path, 'venv'))
 install_project_command = [py_venv_interpreter_path, '-m', 'pip', 'install', '-e', root_path]
 templateman.run_command(install_project_command, path=root_path)
 
@@ -91,5 +84,4 @@ if __name__ == '__main__':
     sys.exit(main(sys.argv[1:]))
 
 """
-with open(os.path.join(src_directory, '__main__.py'), 'w') as py_main:
-    py_main.write(py_main_text)
+templateman.write_file(os.path.join(src_directory, '__main__.py'), py_main_text)
@@ -0,0 +1,68 @@
+import microtest
+import microtest.utils as utils
+
+import os
+import subprocess
+import templateman
+import templateman.venvs as venvs
+
+
+@microtest.test
+def test_environment_keys():
+    assert venvs.environment_key(['a', 'b==1.0']) == venvs.environment_key(['b==1.0', 'a', 'a'])
+    assert venvs.environment_key(['a']) != venvs.environment_key([])
+
+
+@microtest.test
+def test_environments_are_cloned_from_cache():
+    with utils.create_temp_dir() as dir_path:
+        cache_dir = os.path.join(dir_path, 'cache')
+        with microtest.patch(os, environ = { **os.environ, venvs.VENV_CACHE_ENV_VAR: cache_dir }):
+            first = templateman.create_venv(os.path.join(dir_path, 'first'))
+            second = templateman.create_venv(os.path.join(dir_path, 'second'))
+
+        assert len(os.listdir(cache_dir)) == 1
+        base = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+        for interpreter in (first, second):
+            venv_path = os.path.dirname(os.path.dirname(interpreter))
+            proc = subprocess.run([interpreter, '-c', 'import sys; print(sys.prefix)'], stdout=subprocess.PIPE, text=True)
+            assert proc.stdout.strip() == venv_path
+
+            with open(os.path.join(venv_path, venvs.SCRIPTS_DIRECTORY_NAME, 'activate'), 'r') as file:
+                activate_text = file.read()
+            assert venv_path in activate_text
+            assert base not in activate_text
+
+
+@microtest.test
+def test_environments_are_not_linked_to_cache():
+    with utils.create_temp_dir() as dir_path:
+        cache_dir = os.path.join(dir_path, 'cache')
+        venv_path = os.path.join(dir_path, 'venv')
+        with microtest.patch(os, environ = { **os.environ, venvs.VENV_CACHE_ENV_VAR: cache_dir }):
+            with microtest.patch(templateman, copy_strategy = 'hardlink'):
+                templateman.create_venv(venv_path)
+
+        for root, _, filenames in os.walk(venv_path):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                if not os.path.islink(path):
+                    assert os.stat(path).st_nlink == 1
+
+
+@microtest.test
+def test_environments_are_not_created_in_staged_mode():
+    with utils.create_temp_dir() as dir_path:
+        venv_path = os.path.join(dir_path, 'venv')
+        templateman.begin_staging(dir_path)
+        try:
+            interpreter = templateman.create_venv(venv_path)
+        finally:
+            templateman.discard_staging()
+
+        assert interpreter == venvs.interpreter_path(venv_path)
+        assert os.listdir(dir_path) == []
+
+
+if __name__ == '__main__':
+    microtest.run()
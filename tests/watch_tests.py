@@ -0,0 +1,64 @@
+import microtest
+import microtest.utils as utils
+
+import io
+import os
+import contextlib
+import templateman.cli as cli
+import templateman.watching as watching
+
+
+def write_script(path: str, text: str):
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+@microtest.test
+def test_watchers_detect_changes():
+    watchers = [watching.PollingWatcher]
+    if watching.sys.platform.startswith('linux'):
+        watchers.append(watching.InotifyWatcher)
+
+    for watcher_class in watchers:
+        with utils.create_temp_dir(files=['script.py', 'other.py']) as dir_path:
+            watcher = watcher_class(os.path.join(dir_path, 'script.py'))
+            try:
+                write_script(os.path.join(dir_path, 'other.py'), 'ignored')
+                assert not watcher.wait(0.5)
+                write_script(os.path.join(dir_path, 'script.py'), 'changed')
+                assert watcher.wait(1.0)
+                assert not watcher.wait(0.5)
+            finally:
+                watcher.close()
+
+
+@microtest.test
+def test_templates_are_rerun_on_change():
+    with utils.create_temp_dir(files=['script.py']) as dir_path:
+        script_path = os.path.join(dir_path, 'script.py')
+        output_path = os.path.join(dir_path, 'output.txt')
+        write_script(script_path, f'import templateman\ntemplateman.write_file({output_path!r}, "first")\n')
+        wait_for_changes = watching.wait_for_changes
+        runs = list()
+
+        def edit_script(watcher):
+            with open(output_path, 'r') as file:
+                runs.append(file.read())
+            if len(runs) > 1:
+                raise KeyboardInterrupt()
+            write_script(script_path, f'import templateman\ntemplateman.write_file({output_path!r}, "second")\n')
+            wait_for_changes(watcher, 0.05)
+
+        with microtest.patch(watching, wait_for_changes = edit_script):
+            with microtest.patch(cli.templateman, working_dir = dir_path):
+                with io.StringIO() as stream:
+                    with contextlib.redirect_stdout(stream):
+                        cli.run_template(['script.py', '--watch'])
+                    output = stream.getvalue()
+
+        assert runs == ['first', 'second']
+        assert output.count('Watching') == 2
+
+
+if __name__ == '__main__':
+    microtest.run()